@@ -1,25 +1,42 @@
-
-import asyncio
+from fastapi import HTTPException
 from database.chroma_setup_database import query_with_prompt
+from utils import config, AdmissionGate, SingleFlight
 
 
 class ConversationController:
 
+    def __init__(self):
+        # Each chat may pull the collection into memory and start an LLM process, so bound them
+        self.gate = AdmissionGate(
+            max_concurrent=config.CHAT_MAX_CONCURRENCY,
+            max_queue=config.CHAT_MAX_QUEUE,
+            max_wait=config.CHAT_MAX_WAIT_SECONDS,
+        )
+        self.in_flight = SingleFlight()
+
+    async def _answer(self, user_query):
+        async with self.gate.admit():
+            return await query_with_prompt(user_query)
+
     async def chat_data(self, payload):
         try:
             # Extract the latest user query and conversation history
             user_query = payload.query
             # Optionally, you could use payload.conversation_history for context
 
-            # Call the async ChromaDB query_with_prompt function
-            result = await query_with_prompt(user_query)
+            # Identical questions asked at the same time share one retrieval and one LLM call
+            key = " ".join(user_query.lower().split())
+            result = await self.in_flight.do(key, lambda: self._answer(user_query))
 
             # Return the answer and sources as API response
             return {
                 "answer": result.get("answer", ""),
-                "sources": result.get("sources", [])
+                "sources": result.get("sources", []),
+                "usage": result.get("usage", {})
             }
+        except HTTPException:
+            raise
         except Exception as e:
             raise Exception(f"An error occurred in chat_data: {str(e)}")
 
-controller = ConversationController()
\ No newline at end of file
+controller = ConversationController()
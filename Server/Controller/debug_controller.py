@@ -0,0 +1,117 @@
+import ipaddress
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response
+from utils import config
+from utils.profiling import RequestCapture, profiles, debug_state
+
+
+def require_debug_access(request: Request):
+    """Debug endpoints need the configured token, or a loopback client when no token is set"""
+    if config.DEBUG_TOKEN:
+        if request.headers.get("X-Debug-Token") != config.DEBUG_TOKEN:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid debug token")
+        return
+    try:
+        loopback = request.client is not None and ipaddress.ip_address(request.client.host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Debug endpoints are only available from localhost")
+
+
+class DebugController:
+
+    def arm_request_profile(self, payload):
+        if debug_state.request_capture is not None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A request profile is already armed")
+        debug_state.request_capture = RequestCapture(
+            payload.count, payload.path_prefix, payload.mode, payload.interval_ms / 1000
+        )
+        return {"message": "Request profile armed", **debug_state.request_capture.describe()}
+
+    def request_profile_status(self):
+        capture = debug_state.request_capture
+        return {"armed": capture is not None, **(capture.describe() if capture else {})}
+
+    def cancel_request_profile(self):
+        capture, debug_state.request_capture = debug_state.request_capture, None
+        if capture is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No request profile is armed")
+        # Requests already claimed finish normally; keep what was captured so far
+        capture.remaining = 0
+        if capture.in_flight == 0:
+            return {"message": "Request profile stopped", **capture.finish().describe()}
+        return {"message": "Request profile will finish with the requests in flight"}
+
+    def start_sampling(self, payload):
+        try:
+            settings = debug_state.start_sampling(payload.interval_ms / 1000, payload.duration_seconds)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        return {"message": "Sampling profiler started", **settings}
+
+    def stop_sampling(self):
+        try:
+            result = debug_state.stop_sampling()
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        return {"message": "Sampling profiler stopped", **result.describe()}
+
+    def list_profiles(self):
+        return {"profiles": profiles.list()}
+
+    def download_profile(self, profile_id, output_format):
+        result = profiles.get(profile_id)
+        if result is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown profile: {profile_id}")
+        try:
+            body, media_type, extension = result.render(output_format or "json")
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return Response(
+            content=body,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.{extension}"'},
+        )
+
+    def start_memory(self, payload):
+        debug_state.memory.start(payload.frames)
+        return {"message": "tracemalloc started", **debug_state.memory.describe()}
+
+    def stop_memory(self):
+        debug_state.memory.stop()
+        return {"message": "tracemalloc stopped"}
+
+    def memory_status(self):
+        return debug_state.memory.describe()
+
+    def take_memory_snapshot(self):
+        try:
+            return debug_state.memory.take()
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    def memory_top(self, snapshot_id, limit, group_by):
+        try:
+            return debug_state.memory.top(snapshot_id, limit, group_by)
+        except KeyError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+    def memory_diff(self, base, target, limit, group_by):
+        try:
+            return debug_state.memory.diff(base, target, limit, group_by)
+        except KeyError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+    def start_loop_lag(self, payload):
+        debug_state.loop_lag.start(payload.interval_ms / 1000)
+        return {"message": "Event loop lag monitor started", "interval_ms": payload.interval_ms}
+
+    def stop_loop_lag(self):
+        debug_state.loop_lag.stop()
+        return {"message": "Event loop lag monitor stopped", **debug_state.loop_lag.report()}
+
+    def loop_lag_report(self):
+        return debug_state.loop_lag.report()
+
+debug_controller = DebugController()
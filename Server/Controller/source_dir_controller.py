@@ -1,6 +1,23 @@
+import os
 import asyncio
+from fastapi import HTTPException
 from database.chroma_setup_database import add_folder
-from fastapi.responses import JSONResponse
+from database.google_drive import sync_drive_folder
+from database.index_snapshot import export_snapshot, import_snapshot, resolve_snapshot_path
+from database.storage_manager import disk_usage, compact_live_generation
+
+def _http_error(e: Exception) -> HTTPException:
+    """The HTTP error a failed request is answered with; the exception handler wraps it in ErrorResponse"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, (FileNotFoundError, NotADirectoryError)):
+        return HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, PermissionError):
+        return HTTPException(status_code=403, detail=str(e))
+    if isinstance(e, ValueError):
+        return HTTPException(status_code=400, detail=str(e))
+    return HTTPException(status_code=500, detail=str(e))
+
 
 class SourceDirController:
     def __init__(self):
@@ -8,22 +25,81 @@ class SourceDirController:
     
     async def browse_drive(self, payload):
         try:
+            if not os.path.isdir(payload.path):
+                raise NotADirectoryError(f"Folder not found: {payload.path}")
             result = await add_folder(payload.path)
+            if "error" in result:
+                # The folder was read, but nothing in it could be indexed
+                raise HTTPException(status_code=422, detail=result["error"])
             response = {
                 "message": "Added to the database",
                 "files_processed": result["files_processed"],
-                "chunks_added": result["chunks_added"]
+                "chunks_added": result["chunks_added"],
+                "duplicates_removed": result.get("duplicates_removed", 0),
+                "facts_extracted": result.get("facts_extracted", 0)
             }
             return  response
         except Exception as e:
-            return {"error": str(e)}
+            raise _http_error(e)
+
+    async def google_drive(self, payload):
+        try:
+            result = await sync_drive_folder(payload.path)
+            if "error" in result:
+                raise HTTPException(status_code=422, detail=result["error"])
+            response = {
+                "message": "Synced Google Drive folder to the database",
+                "sync_mode": result["sync_mode"],
+                "files_processed": result["files_processed"],
+                "files_failed": result["files_failed"],
+                "files_removed": result["files_removed"],
+                "chunks_added": result["chunks_added"],
+                "duplicates_removed": result["duplicates_removed"],
+                "facts_extracted": result.get("facts_extracted", 0)
+            }
+            return response
+        except Exception as e:
+            raise _http_error(e)
+
+    async def export_snapshot(self, payload):
+        try:
+            path = resolve_snapshot_path(payload.path)
+            manifest = await export_snapshot(path)
+            return {
+                "message": "Exported index snapshot",
+                "path": path,
+                "chunks": manifest["count"],
+                "files": len(manifest["files"]),
+                "model_name": manifest["model_name"]
+            }
+        except Exception as e:
+            raise _http_error(e)
+
+    async def import_snapshot(self, payload):
+        try:
+            manifest = await import_snapshot(resolve_snapshot_path(payload.path))
+            return {
+                "message": "Imported index snapshot",
+                "chunks": manifest["count"],
+                "files": len(manifest["files"]),
+                "model_name": manifest["model_name"]
+            }
+        except Exception as e:
+            raise _http_error(e)
+
+    async def storage_usage(self):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, disk_usage)
+        except Exception as e:
+            raise _http_error(e)
 
-    def google_drive(self, payload):
+    async def compact_storage(self, payload):
         try:
-            # You can add your logic here to process the payload for Google Drive
-            return "google_drive success"
+            result = await compact_live_generation(force=payload.force)
+            message = "Compacted the live index generation" if result["compacted"] else "Nothing worth compacting"
+            return {"message": message, **result}
         except Exception as e:
-            raise Exception(f"An error occurred in google_drive: {str(e)}")
+            raise _http_error(e)
 
 source_dir_controller = SourceDirController()
 
@@ -0,0 +1,19 @@
+from typing import Literal
+from pydantic import BaseModel, Field
+
+class RequestProfilePayload(BaseModel):
+    count: int = Field(10, ge=1, le=1000)
+    path_prefix: str = "/api/"
+    mode: Literal["cprofile", "sampling"] = "cprofile"
+    interval_ms: float = Field(5, gt=0)
+
+class SamplingPayload(BaseModel):
+    interval_ms: float = Field(5, gt=0)
+    # 0 keeps sampling until it is stopped
+    duration_seconds: float = Field(0, ge=0)
+
+class MemoryStartPayload(BaseModel):
+    frames: int = Field(10, ge=1, le=100)
+
+class LoopLagPayload(BaseModel):
+    interval_ms: float = Field(100, gt=0)
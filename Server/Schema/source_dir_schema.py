@@ -2,3 +2,7 @@ from pydantic import BaseModel
 
 class RoutePathPayload(BaseModel):
     path: str
+
+class StorageCompactPayload(BaseModel):
+    # Compact even when less than INDEX_COMPACT_MIN_RECLAIM_MB would be reclaimed
+    force: bool = False
@@ -1,22 +1,31 @@
 import os
 import re
+import json
 import asyncio
 import textract
-import chromadb
+import threading
 import subprocess
-from InstructorEmbedding import INSTRUCTOR
 from concurrent.futures import ThreadPoolExecutor
 from difflib import SequenceMatcher
-import shutil
-
-# Initialize ChromaDB client
-CHROMA_DB_PATH = "./data/chroma_db"
-client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-collection = client.get_or_create_collection(
-    name="documents",
-    metadata={"hnsw:space": "cosine"}
+from utils import config
+from .chunk_dedup import ChunkDeduplicator
+from .context_budget import build_context, count_tokens
+from .query_analysis import extract_keywords, extract_phrases_and_context
+from .keyword_matcher import get_matcher, segment_sentences, encode_offsets, decode_offsets, matching_sentence_offsets
+from .embedding_service import get_embedding_model, DOCUMENT_INSTRUCTION, QUERY_INSTRUCTION
+from .embedding_scheduler import EmbeddingScheduler
+from .folder_scanner import scan_folder, ScanRules, new_scan_stats
+from .text_extraction import iter_text, chunk_stream
+from .fact_store import FactWriter, answer_from_facts
+from .index_store import (
+    index_write_lock, get_live_generation, reading_collection,
+    create_staging_generation, discard_generation, activate_generation
 )
 
+def get_collection():
+    """Return the live collection, following the index pointer when another worker swapped generations"""
+    return get_live_generation().collection
+
 def clear_collection_all(collection):
     """
     Remove all documents from the collection.
@@ -59,21 +68,36 @@ def clear_collection_all(collection):
         print(f"⚠️ Failed to clear existing ChromaDB data: {e}")
         raise e  # Re-raise the exception so the calling function knows it failed
 
-# Load InstructorEmbedding model once
-instructor_model = INSTRUCTOR("hkunlp/instructor-base")
-
 executor = ThreadPoolExecutor(max_workers=4)  # parallelism
 
 def embed_sync(texts):
     """Generate embeddings synchronously"""
-    instructions = [["Represent the document for retrieval:", t] for t in texts]
-    return instructor_model.encode(instructions)
+    instructions = [[DOCUMENT_INSTRUCTION, t] for t in texts]
+    return get_embedding_model().encode(instructions)
 
 async def embed(texts):
     """Async wrapper for embeddings"""
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(executor, embed_sync, texts)
 
+def embed_queries_sync(queries):
+    """Generate query embeddings synchronously"""
+    instructions = [[QUERY_INSTRUCTION, q] for q in queries]
+    return get_embedding_model().encode(instructions)
+
+# Concurrent chat queries are embedded together instead of one forward pass each
+query_embedding_scheduler = EmbeddingScheduler(
+    embed_queries_sync,
+    executor,
+    max_batch=config.QUERY_EMBED_MAX_BATCH,
+    max_delay_ms=config.QUERY_EMBED_MAX_DELAY_MS,
+    cache_size=config.QUERY_EMBED_CACHE_SIZE,
+)
+
+async def embed_query(query: str):
+    """Embed a single chat query through the micro-batching scheduler"""
+    return await query_embedding_scheduler.embed(query.strip())
+
 def load_file(file_path: str) -> str:
     """Extract text from file using textract"""
     try:
@@ -165,225 +189,282 @@ def format_fallback_response(context_chunks: str, user_query: str) -> str:
 def check_existing_data():
     """Check if there's existing data in the ChromaDB collection"""
     try:
-        count = collection.count()
+        count = get_collection().count()
         return count > 0, count
     except Exception as e:
         print(f"⚠️ Error checking existing data: {e}")
         return False, 0
 
 async def add_folder(folder_path: str):
-    """Process all files in a folder asynchronously and add to ChromaDB, removing existing data and files first"""
-    global client, collection
+    """Process all files in a folder asynchronously into a new ChromaDB generation that replaces the current one"""
+    # Only one worker process may rebuild the index at a time
+    async with index_write_lock():
+        return await _rebuild_index(folder_path)
 
+async def _rebuild_index(folder_path: str):
+    """
+    Build a fresh index generation from folder_path next to the live one and swap it in once verified.
+    Callers must hold the index write lock.
+    """
     if not os.path.exists(folder_path):
         raise FileNotFoundError(f"{folder_path} does not exist")
 
-    # Check if there's existing data in the collection
-    has_existing_data, data_count = check_existing_data()
-
-    if has_existing_data:
-        print(f"ℹ️ Found {data_count} existing documents in ChromaDB collection")
-        print("🧹 Clearing existing data before adding new data...")
-
-        # Remove all existing data from the collection before adding new data
-        try:
-            # Use the clear_collection_all function to properly remove all documents
-            clear_collection_all(collection)
-            print("✅ Successfully cleared existing ChromaDB data")
-        except Exception as e:
-            print(f"⚠️ Failed to clear existing ChromaDB data: {e}")
-            raise e  # Stop the process if we can't clear existing data
-    else:
-        print("ℹ️ No existing data found in ChromaDB collection, proceeding with new data")
-
-    # Force close any existing connections and clear the data directory
+    # The live generation keeps answering queries while the staging one is built
     try:
-        # Close existing client connections
-        if 'client' in globals():
-            del client
-        if 'collection' in globals():
-            del collection
-        print("🔌 Closed existing ChromaDB connections")
-    except:
-        pass
-
-    # Remove all files and folders under the ChromaDB data directory
-    chroma_data_path = "./data/chroma_db"
-    if os.path.exists(chroma_data_path):
-        print("🧹 Clearing ChromaDB data directory...")
-        import time
-        time.sleep(1)  # Give time for connections to close
-
-        try:
-            # Force remove with error handling
-            shutil.rmtree(chroma_data_path, ignore_errors=True)
-            print("✅ Successfully cleared ChromaDB data directory")
-        except Exception as e:
-            print(f"⚠️ Failed to clear ChromaDB data directory: {e}")
-            # Try to remove individual files with force
-            try:
-                for root, dirs, files in os.walk(chroma_data_path, topdown=False):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        try:
-                            os.chmod(file_path, 0o777)  # Make writable
-                            os.remove(file_path)
-                        except:
-                            pass
-                    for dir in dirs:
-                        dir_path = os.path.join(root, dir)
-                        try:
-                            os.chmod(dir_path, 0o777)  # Make writable
-                            os.rmdir(dir_path)
-                        except:
-                            pass
-                os.rmdir(chroma_data_path)
-                print("✅ Force cleared ChromaDB data directory")
-            except Exception as e2:
-                print(f"⚠️ Could not clear directory: {e2}")
-
-    # Create a new ChromaDB client and collection with a fresh path
-    try:
-        # Use a timestamp to ensure unique database
-        import time
-        timestamp = int(time.time())
-        new_db_path = f"./data/chroma_db_{timestamp}"
-
-        # Create the directory with proper permissions
-        os.makedirs(new_db_path, mode=0o755, exist_ok=True)
-
-        client = chromadb.PersistentClient(path=new_db_path)
-        collection = client.get_or_create_collection(
-            name="documents",
-            metadata={"hnsw:space": "cosine"}
-        )
-        print(f"✅ Created new ChromaDB client and collection at: {new_db_path}")
-
-        # Update the global path for future use
-        global CHROMA_DB_PATH
-        CHROMA_DB_PATH = new_db_path
-
+        staging = create_staging_generation()
+        print(f"✅ Created staging ChromaDB collection at: {staging.path}")
     except Exception as e:
-        print(f"❌ Failed to create new ChromaDB client: {e}")
+        print(f"❌ Failed to create staging ChromaDB collection: {e}")
         raise e
 
-    # Find all files in the folder (filter supported formats)
-    supported_extensions = {'.csv', '.doc', '.docx', '.eml', '.epub', '.gif', '.htm', '.html', '.jpeg', '.jpg', '.json', '.log', '.mp3', '.msg', '.odt', '.ogg', '.pdf', '.png', '.pptx', '.ps', '.psv', '.rtf', '.tab', '.tff', '.tif', '.tiff', '.tsv', '.txt', '.wav', '.xls', '.xlsx'}
-
-    file_paths = []
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            file_ext = os.path.splitext(file)[1].lower()
-            if file_ext in supported_extensions:
-                file_paths.append(file_path)
-            else:
-                print(f"⚠️ Skipping unsupported file format: {file} (extension: {file_ext})")
-
-    print(f"📁 Found {len(file_paths)} files to process")
-    if len(file_paths) == 0:
-        print("⚠️ No files found in the specified folder")
-        return {
-            "files_processed": 0,
-            "chunks_added": 0,
-            "error": "No files found in folder"
-        }
-
-    # Process each file
-    print("🔄 Processing files...")
-    tasks = []
-    for file_path in file_paths:
-        print(f"  📄 Processing: {os.path.basename(file_path)}")
-        tasks.append(process_file(file_path))
-
     try:
-        results = await asyncio.gather(*tasks)
-        print("✅ All files processed successfully")
-    except Exception as e:
-        print(f"❌ Error processing files: {e}")
-        return {
-            "files_processed": 0,
-            "chunks_added": 0,
-            "error": f"Error processing files: {str(e)}"
-        }
+        result = await _build_generation(folder_path, staging)
+    except Exception:
+        discard_generation(staging)
+        raise
 
-    # Flatten and prepare data for insertion
-    all_chunks, all_ids, all_metas = [], [], []
-    for i, (chunks, ids, metas) in enumerate(results):
-        if chunks:  # Only add if we got content
-            all_chunks.extend(chunks)
-            all_ids.extend(ids)
-            all_metas.extend(metas)
-            print(f"  ✅ {os.path.basename(file_paths[i])}: {len(chunks)} chunks")
-        else:
-            print(f"  ⚠️ {os.path.basename(file_paths[i])}: No content extracted")
+    if "error" in result:
+        print("ℹ️ Staging build did not complete, the current index stays live")
+        discard_generation(staging)
+        return result
 
-    if not all_chunks:
-        print("❌ No content extracted from any files")
-        return {
-            "files_processed": len(file_paths),
-            "chunks_added": 0,
-            "error": "No content could be extracted from files"
-        }
+    activate_generation(staging)
+    print(f"🔀 Index generation {staging.path} is now live")
+    return result
 
-    print(f"📊 Total chunks to add: {len(all_chunks)}")
+async def _build_generation(folder_path: str, staging):
+    """
+    Extract, chunk, embed and add every supported file under folder_path to the staging generation,
+    and fill its fact table from the structured files
+    """
+    # Files stream out of the scanner into extraction, and chunks stream from extraction into embedding,
+    # so memory is bounded by the embedding batch rather than by file or folder size
+    print("🔄 Scanning and processing files...")
+    scan_stats = new_scan_stats()
+    collection = staging.collection
+    writer = GenerationWriter(collection, config.INGEST_EMBED_BATCH_SIZE)
+    facts = FactWriter(staging.path) if config.FACTS_ENABLED else None
 
     try:
-        # Generate embeddings
-        print("🧠 Generating embeddings...")
-        embeddings = await embed(all_chunks)
-        print(f"✅ Generated {len(embeddings)} embeddings")
-
-        # Add to ChromaDB
-        print("💾 Adding data to ChromaDB...")
-        collection.add(
-            ids=all_ids,
-            documents=all_chunks,
-            embeddings=embeddings,
-            metadatas=all_metas
-    )
-        print("✅ Successfully added data to ChromaDB")
-
-        # Verify the data was added
+        results = await _process_files(
+            scan_folder(folder_path, ScanRules.from_config(), scan_stats),
+            lambda path: ingest_file(path, writer, facts),
+        )
+        print(f"📁 Scan finished: {scan_stats['files_found']} files found, "
+              f"{scan_stats['skipped_unsupported']} unsupported, {scan_stats['skipped_excluded']} excluded, "
+              f"{scan_stats['skipped_hidden_or_temp']} hidden/temp, {scan_stats['skipped_too_large']} too large, "
+              f"{scan_stats['skipped_symlinks']} symlinks, {scan_stats['errors']} errors")
+
+        if len(results) == 0:
+            print("⚠️ No files found in the specified folder")
+            return {
+                "files_processed": 0,
+                "chunks_added": 0,
+                "error": "No files found in folder"
+            }
+
+        await writer.finish()
+        if writer.chunks_added == 0:
+            print("❌ No content extracted from any files")
+            return {
+                "files_processed": len(results),
+                "chunks_added": 0,
+                "error": "No content could be extracted from files"
+            }
+        print(f"✅ Folded {writer.duplicates_removed} duplicate chunks into their canonical copies")
+
+        # Verify the data was added before the generation is allowed to go live
         final_count = collection.count()
         print(f"📈 ChromaDB now contains {final_count} documents")
+        if final_count != writer.chunks_added:
+            raise ValueError(f"expected {writer.chunks_added} documents in staging collection, found {final_count}")
 
     except Exception as e:
         print(f"❌ Error adding data to ChromaDB: {e}")
-        return {
-            "files_processed": len(file_paths),
-            "chunks_added": 0,
-            "error": f"Error adding to ChromaDB: {str(e)}"
-        }
+        raise
+    finally:
+        if facts is not None:
+            facts.close()
 
     return {
-        "files_processed": len(file_paths),
-        "chunks_added": len(all_chunks),
+        "files_processed": len(results),
+        "chunks_added": writer.chunks_added,
+        "duplicates_removed": writer.duplicates_removed,
+        "facts_extracted": facts.facts_added if facts is not None else 0,
         "final_document_count": final_count
     }
 
-async def process_file(file_path: str):
-    """Extract, chunk, and prepare metadata for a single file"""
-    try:
-        print(f"    🔍 Extracting text from: {os.path.basename(file_path)}")
-        text = load_file(file_path)
-
-        if not text or text.strip() == "":
-            print(f"    ⚠️ No text extracted from: {os.path.basename(file_path)}")
-            return [], [], []
+class GenerationWriter:
+    """
+    De-duplicate, embed and add chunks to a collection in batches of batch_size as they arrive.
+    Canonical chunks that absorb a duplicate after they were written get their metadata updated
+    in finish().
+    """
 
-        print(f"    📝 Extracted {len(text)} characters from: {os.path.basename(file_path)}")
-        chunks = chunk_text(text)
-        print(f"    ✂️ Created {len(chunks)} chunks from: {os.path.basename(file_path)}")
+    def __init__(self, collection, batch_size: int):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.deduplicator = ChunkDeduplicator(
+            max_distance=config.DEDUP_MAX_HAMMING_DISTANCE, retain_chunks=False
+        ) if config.DEDUP_ENABLED else None
+        self.chunks_added = 0
+        self.chunks_reused = 0
+        self._chunks, self._ids, self._metas = [], [], []
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def duplicates_removed(self):
+        return self.deduplicator.duplicates_removed if self.deduplicator else 0
+
+    async def add(self, chunk: str, chunk_id: str, meta: dict):
+        if self.deduplicator is not None:
+            if not self.deduplicator.add(chunk, chunk_id, meta):
+                return
+            meta = self.deduplicator.metas[-1]
+        self._chunks.append(chunk)
+        self._ids.append(chunk_id)
+        self._metas.append(meta)
+        if len(self._chunks) >= self.batch_size:
+            # Producers wait here while the batch is embedded, which bounds how far extraction runs ahead
+            await self.flush()
+
+    async def add_embedded(self, chunks: list, ids: list, metas: list, embeddings: list):
+        """Write chunks that keep their stored embeddings and register them as canonical copies for later chunks"""
+        if self.deduplicator is not None:
+            for chunk, chunk_id, meta in zip(chunks, ids, metas):
+                self.deduplicator.add_canonical(chunk, chunk_id, meta)
+            metas = self.deduplicator.metas[-len(ids):]
+        async with self._flush_lock:
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.collection.add(ids=ids, documents=chunks, embeddings=embeddings, metadatas=metas)
+            )
+        self.chunks_reused += len(ids)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._chunks:
+                return
+            chunks, ids, metas = self._chunks, self._ids, self._metas
+            self._chunks, self._ids, self._metas = [], [], []
+            embeddings = await embed(chunks)
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.collection.add(ids=ids, documents=chunks, embeddings=embeddings, metadatas=metas)
+            )
+            self.chunks_added += len(ids)
+            print(f"  💾 Added {self.chunks_added} chunks so far")
 
-        ids = [f"{os.path.basename(file_path)}_chunk{i}" for i in range(len(chunks))]
-        metas = [{"source": file_path}] * len(chunks)
+    async def finish(self):
+        await self.flush()
+        if self.deduplicator is None:
+            return
+        ids, metas = self.deduplicator.changed_metadata()
+        for start in range(0, len(ids), self.batch_size):
+            self.collection.update(ids=ids[start:start + self.batch_size], metadatas=metas[start:start + self.batch_size])
 
-        return chunks, ids, metas
+async def _iterate_in_thread(iterable, maxsize: int):
+    """
+    Consume a blocking iterator on its own thread and yield its items here. The bounded queue makes
+    the thread wait when the consumer falls behind. A dedicated thread rather than the executor keeps
+    blocked producers from starving the executor work their consumers are waiting on.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+    done = object()
+    errors = []
 
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+    thread = threading.Thread(target=produce, name="ingest-producer", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        # On failure or cancellation unblock the thread so it can see the stop flag
+        stop.set()
+        while thread.is_alive():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+
+async def _process_files(file_paths, handle):
+    """
+    Run handle(path) over a (blocking) iterator of paths with INGEST_WORKERS concurrent workers.
+    The iterator is consumed on a separate thread, so a slow directory listing and extraction
+    overlap. Returns a list of (path, result) in completion order.
+    """
+    workers = max(1, config.INGEST_WORKERS)
+    queue = asyncio.Queue(maxsize=workers)
+    results = []
+
+    async def feed():
+        async for path in _iterate_in_thread(file_paths, config.SCAN_QUEUE_SIZE):
+            await queue.put(path)
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def consume():
+        while (path := await queue.get()) is not None:
+            print(f"  📄 Processing: {os.path.basename(path)}")
+            results.append((path, await handle(path)))
+
+    tasks = [asyncio.ensure_future(feed())] + [asyncio.ensure_future(consume()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+def _file_chunks(file_path: str, id_prefix: str = None, metadata: dict = None):
+    """
+    Blocking generator of (chunk, id, metadata) for one file, extracted and chunked incrementally.
+    Ids are '<id_prefix>_chunk<n>' (the file name by default); metadata is added to every chunk's metadata.
+    """
+    name = os.path.basename(file_path)
+    id_prefix = id_prefix or name
+    try:
+        for index, chunk in enumerate(chunk_stream(iter_text(file_path))):
+            # Sentence segmentation is done once here so queries only have to look up offsets
+            meta = {"source": file_path, "chunk_index": index, "sentence_offsets": encode_offsets(segment_sentences(chunk))}
+            if metadata:
+                meta.update(metadata)
+            yield chunk, f"{id_prefix}_chunk{index}", meta
     except Exception as e:
-        print(f"    ❌ Error processing {os.path.basename(file_path)}: {e}")
-        return [], [], []
+        # Chunks already yielded are kept; the rest of the file is skipped
+        print(f"    ❌ Error processing {name}: {e}")
+
+async def ingest_file(file_path: str, writer: GenerationWriter, facts: FactWriter = None,
+                      id_prefix: str = None, metadata: dict = None) -> int:
+    """Stream one file into the writer (and its numbers into the fact table); returns the number of chunks it produced"""
+    count = 0
+    chunks = _file_chunks(file_path, id_prefix, metadata)
+    async for chunk, chunk_id, meta in _iterate_in_thread(chunks, config.INGEST_EMBED_BATCH_SIZE):
+        await writer.add(chunk, chunk_id, meta)
+        count += 1
+    if facts is not None:
+        await asyncio.get_running_loop().run_in_executor(None, facts.add_file, file_path)
+    if count:
+        print(f"  ✅ {os.path.basename(file_path)}: {count} chunks")
+    else:
+        print(f"  ⚠️ {os.path.basename(file_path)}: No content extracted")
+    return count
 
 def filter_relevant_chunks(user_query: str, documents: list, metadatas: list, min_relevance_score: float = 0.5):
     """
@@ -427,98 +508,24 @@ def extract_query_intent(text: str):
     # The system should work for any type of data
     return intent
 
-def extract_keywords(text: str):
-    """Extract important keywords from user query with natural language understanding"""
-    # Remove common stop words
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'what', 'when', 'where', 'why', 'how', 'who', 'which', 'this', 'that', 'these', 'those', 'provide', 'show', 'give', 'tell', 'me', 'details', 'about', 'from', 'get', 'find', 'search', 'look', 'see', 'want', 'need', 'please', 'you', 'your', 'could', 'would', 'can', 'please'}
-
-    # Extract words (alphanumeric only)
-    words = re.findall(r'\b\w+\b', text.lower())
-
-    # Filter out stop words and short words, but keep important terms
-    keywords = []
-    for word in words:
-        if word not in stop_words and len(word) > 1:
-            keywords.append(word)
-
-    # Add common variations and typo corrections
-    expanded_keywords = []
-    for keyword in keywords:
-        expanded_keywords.append(keyword)
-
-        # Add common variations
-        if keyword.endswith('s') and len(keyword) > 3:
-            expanded_keywords.append(keyword[:-1])  # Remove 's' for singular
-        if not keyword.endswith('s') and len(keyword) > 3:
-            expanded_keywords.append(keyword + 's')  # Add 's' for plural
-
-        # Add common typo corrections
-        if keyword == 'mailestone':
-            expanded_keywords.extend(['milestone', 'milestones'])
-        elif keyword == 'milestone':
-            expanded_keywords.extend(['mailestone', 'milestones'])
-        elif keyword == 'detials':
-            expanded_keywords.extend(['details'])
-        elif keyword == 'details':
-            expanded_keywords.extend(['detials'])
-
-    return list(set(expanded_keywords))  # Remove duplicates
-
-def extract_phrases_and_context(text: str):
-    """Extract important phrases and context from natural language queries"""
-    text_lower = text.lower()
-
-    # Common phrase patterns
-    phrases = []
-
-    # Look for "X details" patterns
-    detail_patterns = re.findall(r'(\w+(?:\s+\w+)*)\s+details?', text_lower)
-    for pattern in detail_patterns:
-        phrases.append(pattern.strip())
-
-    # Look for "provide X" patterns
-    provide_patterns = re.findall(r'provide\s+(\w+(?:\s+\w+)*)', text_lower)
-    for pattern in provide_patterns:
-        phrases.append(pattern.strip())
-
-    # Look for "show X" patterns
-    show_patterns = re.findall(r'show\s+(\w+(?:\s+\w+)*)', text_lower)
-    for pattern in show_patterns:
-        phrases.append(pattern.strip())
-
-    # Look for "X information" patterns
-    info_patterns = re.findall(r'(\w+(?:\s+\w+)*)\s+information', text_lower)
-    for pattern in info_patterns:
-        phrases.append(pattern.strip())
-
-    # Look for "X diagram" patterns
-    diagram_patterns = re.findall(r'(\w+(?:\s+\w+)*)\s+diagram', text_lower)
-    for pattern in diagram_patterns:
-        phrases.append(pattern.strip())
-
-    # Look for "X architecture" patterns
-    arch_patterns = re.findall(r'(\w+(?:\s+\w+)*)\s+architecture', text_lower)
-    for pattern in arch_patterns:
-        phrases.append(pattern.strip())
-
-    return phrases
-
 def find_relevant_chunks_hybrid(user_query: str, documents: list, metadatas: list, search_terms: list):
     """
     Find relevant chunks using hybrid keyword and phrase matching
     """
     user_query_lower = user_query.lower()
     relevant_chunks = []
+    matcher = get_matcher(tuple(search_terms))
 
     for i, (doc, metadata) in enumerate(zip(documents, metadatas)):
         doc_lower = doc.lower()
 
-        # Check for both individual keywords and phrases
+        # Check for both individual keywords and phrases in a single pass over the document
+        found = matcher.matched_terms(doc_lower)
         matches = 0
         match_types = []
 
         for term in search_terms:
-            if term in doc_lower:
+            if term in found:
                 matches += 1
                 if ' ' in term:  # It's a phrase
                     match_types.append('phrase')
@@ -528,7 +535,7 @@ def find_relevant_chunks_hybrid(user_query: str, documents: list, metadatas: lis
         # Only include documents that have at least one match
         if matches > 0:
             # Extract only the relevant sentences/paragraphs containing search terms
-            relevant_content = extract_relevant_sentences(doc, search_terms)
+            relevant_content = extract_relevant_sentences(doc, search_terms, (metadata or {}).get("sentence_offsets"))
 
             if relevant_content:  # Only add if we found relevant content
                 # Calculate relevance score with bonus for phrase matches
@@ -554,20 +561,19 @@ def find_relevant_chunks_by_keywords(user_query: str, documents: list, metadatas
     """
     user_query_lower = user_query.lower()
     relevant_chunks = []
+    matcher = get_matcher(tuple(user_keywords))
 
     for i, (doc, metadata) in enumerate(zip(documents, metadatas)):
         doc_lower = doc.lower()
 
         # Check if document contains any of the user keywords
-        keyword_matches = 0
-        for keyword in user_keywords:
-            if keyword in doc_lower:
-                keyword_matches += 1
+        found = matcher.matched_terms(doc_lower)
+        keyword_matches = sum(1 for keyword in user_keywords if keyword in found)
 
         # Only include documents that have at least one keyword match
         if keyword_matches > 0:
             # Extract only the relevant sentences/paragraphs containing keywords
-            relevant_content = extract_relevant_sentences(doc, user_keywords)
+            relevant_content = extract_relevant_sentences(doc, user_keywords, (metadata or {}).get("sentence_offsets"))
 
             if relevant_content:  # Only add if we found relevant content
                 # Calculate a simple relevance score based on keyword matches
@@ -584,50 +590,39 @@ def find_relevant_chunks_by_keywords(user_query: str, documents: list, metadatas
     relevant_chunks.sort(key=lambda x: x["relevance_score"], reverse=True)
     return relevant_chunks[:3]  # Return only top 3 most relevant chunks
 
-def extract_relevant_sentences(text: str, keywords: list):
+def extract_relevant_sentences(text: str, keywords: list, sentence_offsets: str = None):
     """
-    Extract only sentences or paragraphs that contain the specified keywords
+    Extract only sentences or paragraphs that contain the specified keywords.
+    sentence_offsets is the encoded segmentation stored at ingestion; it is computed on the fly when missing.
     """
     if not keywords:
         return text
 
-    # Split text into sentences
-    sentences = re.split(r'[.!?]+', text)
-    relevant_sentences = []
-
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-
-        sentence_lower = sentence.lower()
+    matcher = get_matcher(tuple(keywords))
+    offsets = decode_offsets(sentence_offsets) if sentence_offsets else segment_sentences(text)
+    text_lower = text.lower()
 
-        # Check if sentence contains any of the keywords
-        for keyword in keywords:
-            if keyword in sentence_lower:
-                relevant_sentences.append(sentence)
-                break  # Don't add the same sentence multiple times
+    if len(text_lower) == len(text):
+        # One scan of the whole text, then map each hit onto its sentence by offset
+        matched, any_match = matching_sentence_offsets(text_lower, offsets, matcher)
+    else:
+        # Lowercasing changed the length (rare Unicode), so offsets no longer line up: match per sentence
+        matched = [i for i, (start, end) in enumerate(offsets) if matcher.matched_terms(text[start:end].lower())]
+        any_match = bool(matched) or bool(matcher.matched_terms(text_lower))
 
     # If we found relevant sentences, return them
-    if relevant_sentences:
-        return '. '.join(relevant_sentences) + '.'
+    if matched:
+        return '. '.join(text[offsets[i][0]:offsets[i][1]] for i in matched) + '.'
 
-    # If no sentences found, try paragraph-based extraction
-    paragraphs = text.split('\n\n')
-    relevant_paragraphs = []
+    if not any_match:
+        return ""
 
-    for paragraph in paragraphs:
+    # A term only occurs across a sentence boundary, try paragraph-based extraction
+    relevant_paragraphs = []
+    for paragraph in text.split('\n\n'):
         paragraph = paragraph.strip()
-        if not paragraph:
-            continue
-
-        paragraph_lower = paragraph.lower()
-
-        # Check if paragraph contains any of the keywords
-        for keyword in keywords:
-            if keyword in paragraph_lower:
-                relevant_paragraphs.append(paragraph)
-                break
+        if paragraph and matcher.matched_terms(paragraph.lower()):
+            relevant_paragraphs.append(paragraph)
 
     if relevant_paragraphs:
         return '\n\n'.join(relevant_paragraphs)
@@ -652,9 +647,80 @@ def calculate_relevance_score(user_query: str, document: str, user_keywords: lis
 
     return min(score, 1.0)  # Cap at 1.0
 
+async def find_relevant_chunks_semantic(user_query: str, top_k: int = 5):
+    """
+    Find relevant chunks by vector similarity to the embedded query
+    """
+    query_embedding = await embed_query(user_query)
+
+    def search():
+        with reading_collection() as collection:
+            count = collection.count()
+            if count == 0:
+                return None
+            return collection.query(
+                query_embeddings=[[float(value) for value in query_embedding]],
+                n_results=min(top_k, count)
+            )
+
+    loop = asyncio.get_event_loop()
+    results = await loop.run_in_executor(None, search)
+    if not results:
+        return []
+
+    relevant_chunks = []
+    for doc, metadata, distance in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
+        # Cosine distance; anything further away is unrelated to the question
+        if distance <= config.VECTOR_SEARCH_MAX_DISTANCE:
+            relevant_chunks.append({
+                "content": doc,
+                "metadata": metadata,
+                "relevance_score": 1 - distance
+            })
+
+    return relevant_chunks[:3]  # Return only top 3 most relevant chunks
+
+def load_all_documents():
+    """Read every document and its metadata from the live collection"""
+    with reading_collection() as collection:
+        return collection.get()
+
+PROMPT_TEMPLATE = """[ROLE]
+You are a professional assistant. Answer the user's question using ONLY the provided context.
+
+[CRITICAL INSTRUCTION]
+- Use ONLY the information provided in the context below.
+- Do NOT add any information not present in the context.
+- If the context contains the answer, provide it in a clear, human-readable format.
+- If the context doesn't contain the answer, say: "I don't have that information in the database."
+- Format tabular data in a readable table format.
+- Use bullet points for lists.
+- Keep your response concise and well-structured.
+
+[CONTEXT]
+{context}
+
+[USER QUESTION]
+{question}
+
+[RESPONSE]
+"""
+
+def public_source(metadata: dict) -> dict:
+    """The part of a chunk's metadata that API clients see: its file and every file it was found in"""
+    metadata = metadata or {}
+    source = metadata.get("source")
+    return {"source": source, "sources": json.loads(metadata.get("sources") or "[]") or ([source] if source else [])}
+
+
 async def query_with_prompt(user_text: str, top_k: int = 5):
     """Retrieve data using hybrid keyword and phrase-based search"""
 
+    # Aggregate and lookup questions over extracted numbers are answered from the fact table without the LLM
+    structured = await answer_from_facts(user_text)
+    if structured is not None:
+        return structured
+
     # Extract keywords and phrases from user query
     user_keywords = extract_keywords(user_text.lower())
     user_phrases = extract_phrases_and_context(user_text.lower())
@@ -662,8 +728,9 @@ async def query_with_prompt(user_text: str, top_k: int = 5):
     # Combine keywords and phrases for comprehensive search
     all_search_terms = user_keywords + user_phrases
 
-    # Get all documents from the collection
-    all_docs = collection.get()
+    # Get all documents from the collection off the event loop
+    loop = asyncio.get_event_loop()
+    all_docs = await loop.run_in_executor(None, load_all_documents)
 
     if not all_docs["documents"]:
         return {
@@ -674,6 +741,10 @@ async def query_with_prompt(user_text: str, top_k: int = 5):
     # Find relevant chunks using hybrid search
     relevant_chunks = find_relevant_chunks_hybrid(user_text, all_docs["documents"], all_docs["metadatas"], all_search_terms)
 
+    # Nothing matched literally, fall back to the nearest chunks by meaning
+    if not relevant_chunks and config.VECTOR_SEARCH_ENABLED:
+        relevant_chunks = await find_relevant_chunks_semantic(user_text, top_k)
+
     # If no relevant chunks found, return a helpful message
     if not relevant_chunks:
         search_terms_display = ', '.join(all_search_terms[:5])  # Show first 5 terms
@@ -682,55 +753,51 @@ async def query_with_prompt(user_text: str, top_k: int = 5):
             "sources": []
         }
 
-    context_chunks = "\n\n".join([chunk["content"] for chunk in relevant_chunks])
-    sources = [chunk["metadata"] for chunk in relevant_chunks]
-
-    prompt = f"""
-            [ROLE]
-            You are a professional assistant. Answer the user's question using ONLY the provided context.
+    # Assemble the context under the token budget; the template itself counts against it
+    def budget_context():
+        reserved_tokens = count_tokens(PROMPT_TEMPLATE.format(context="", question=user_text))
+        return build_context(relevant_chunks, all_search_terms, reserved_tokens=reserved_tokens)
 
-            [CRITICAL INSTRUCTION]
-            - Use ONLY the information provided in the context below.
-            - Do NOT add any information not present in the context.
-            - If the context contains the answer, provide it in a clear, human-readable format.
-            - If the context doesn't contain the answer, say: "I don't have that information in the database."
-            - Format tabular data in a readable table format.
-            - Use bullet points for lists.
-            - Keep your response concise and well-structured.
+    # Tokenizing is CPU work, so it runs off the event loop like the collection read
+    context_chunks, usage = await loop.run_in_executor(None, budget_context)
+    sources = [public_source(chunk["metadata"]) for chunk in relevant_chunks]
+    print(f"🧮 Prompt uses {usage['prompt_tokens']} tokens "
+          f"({usage['context_tokens_before_budget']} context tokens before budgeting, "
+          f"~{usage['estimated_time_saved_ms']} ms saved)")
 
-            [CONTEXT]
-            {context_chunks}
+    prompt = PROMPT_TEMPLATE.format(context=context_chunks, question=user_text)
 
-            [USER QUESTION]
-            {user_text}
-
-            [RESPONSE]
-            """
-
-    # 5. Call local LLM (example: Ollama) with fallback
+    # 5. Call local LLM (example: Ollama) with fallback, without blocking the event loop
     try:
-        process = subprocess.run(
-            ["ollama", "run", "mistral"],  # you can swap model
-            input=prompt,
-            text=True,
-            capture_output=True,
-            timeout=30  # Add timeout to prevent hanging
+        process = await asyncio.create_subprocess_exec(
+            "ollama", "run", "mistral",  # you can swap model
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
         )
+        try:
+            # Add timeout to prevent hanging
+            stdout, stderr = await asyncio.wait_for(process.communicate(prompt.encode("utf-8")), timeout=30)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
 
         if process.returncode == 0:
-            answer = process.stdout.strip()
+            answer = stdout.decode("utf-8", errors="replace").strip()
         else:
-            answer = f"Error running LLM: {process.stderr.strip()}"
+            answer = f"Error running LLM: {stderr.decode('utf-8', errors='replace').strip()}"
 
     except FileNotFoundError:
         # Fallback when Ollama is not installed - format the response properly
         answer = format_fallback_response(context_chunks, user_text)
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         answer = "The AI model is taking too long to respond. Please try again."
     except Exception as e:
         answer = f"An error occurred while processing your request: {str(e)}"
 
     return {
         "answer": answer,
-        "sources": sources
+        "sources": sources,
+        "usage": usage
     }
@@ -0,0 +1,156 @@
+import re
+import json
+import hashlib
+
+_WORD_RE = re.compile(r'\w+')
+_SPACE_RE = re.compile(r'\s+')
+
+SIMHASH_BITS = 64
+
+
+def normalize_chunk(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different copies hash the same"""
+    return _SPACE_RE.sub(' ', text.lower()).strip()
+
+
+def content_hash(text: str) -> str:
+    """Exact-duplicate fingerprint of a chunk"""
+    return hashlib.sha1(normalize_chunk(text).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles; near-identical texts differ in only a few bits"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            if h >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class ChunkDeduplicator:
+    """
+    Collapse exact and near-duplicate chunks onto one canonical chunk.
+
+    Exact copies are caught with a content hash. Near-duplicates are caught with SimHash:
+    the 64-bit fingerprint is cut into (max_distance + 1) bands, so by the pigeonhole principle
+    two fingerprints within max_distance bits share at least one identical band. Only chunks
+    sharing a band are compared, which keeps lookups close to constant time.
+
+    With retain_chunks=False only ids, metadata and fingerprints are kept, so a streaming ingest can
+    write canonical chunks out as they arrive; changed_metadata() then lists the canonical chunks
+    whose sources changed after they were handed out.
+    """
+
+    def __init__(self, max_distance: int = 3, min_words: int = 20, retain_chunks: bool = True):
+        self.max_distance = max_distance
+        self.min_words = min_words
+        self.retain_chunks = retain_chunks
+        self.chunks, self.ids, self.metas = [], [], []
+        self.duplicates_removed = 0
+        self._changed = set()
+
+        self._exact = {}
+        self._fingerprints = []
+        band_count = max_distance + 1
+        width = SIMHASH_BITS // band_count
+        self._band_slices = [
+            (i * width, SIMHASH_BITS if i == band_count - 1 else (i + 1) * width)
+            for i in range(band_count)
+        ]
+        self._bands = [{} for _ in self._band_slices]
+
+    def _band_keys(self, fingerprint: int):
+        for start, end in self._band_slices:
+            yield (fingerprint >> start) & ((1 << (end - start)) - 1)
+
+    def _find_near_duplicate(self, fingerprint: int):
+        checked = set()
+        for band, key in zip(self._bands, self._band_keys(fingerprint)):
+            for index in band.get(key, ()):
+                if index in checked:
+                    continue
+                checked.add(index)
+                if (self._fingerprints[index] ^ fingerprint).bit_count() <= self.max_distance:
+                    return index
+        return None
+
+    def _add_reference(self, index: int, meta: dict):
+        canonical = self.metas[index]
+        sources = json.loads(canonical["sources"])
+        source = meta.get("source")
+        if source and source not in sources:
+            sources.append(source)
+            canonical["sources"] = json.dumps(sources)
+        canonical["duplicate_count"] += 1
+        self.duplicates_removed += 1
+        self._changed.add(index)
+
+    def changed_metadata(self):
+        """(ids, metadatas) of canonical chunks that absorbed duplicates"""
+        indexes = sorted(self._changed)
+        return [self.ids[i] for i in indexes], [self.metas[i] for i in indexes]
+
+    def add(self, chunk: str, chunk_id: str, meta: dict) -> bool:
+        """Add a chunk; returns False when it was folded into an existing canonical chunk"""
+        digest = content_hash(chunk)
+        index = self._exact.get(digest)
+
+        fingerprint = None
+        if index is None and len(_WORD_RE.findall(chunk)) >= self.min_words:
+            fingerprint = simhash(chunk)
+            index = self._find_near_duplicate(fingerprint)
+
+        if index is not None:
+            self._add_reference(index, meta)
+            return False
+
+        meta = dict(meta)
+        meta["content_hash"] = digest
+        meta["sources"] = json.dumps([meta["source"]] if meta.get("source") else [])
+        meta["duplicate_count"] = 0
+        self._register(chunk, chunk_id, meta, digest, fingerprint)
+        return True
+
+    def add_canonical(self, chunk: str, chunk_id: str, meta: dict):
+        """Register a chunk that was de-duplicated in an earlier run, keeping its sources and counts"""
+        fingerprint = simhash(chunk) if len(_WORD_RE.findall(chunk)) >= self.min_words else None
+        meta = dict(meta)
+        meta.setdefault("sources", json.dumps([meta["source"]] if meta.get("source") else []))
+        meta.setdefault("duplicate_count", 0)
+        self._register(chunk, chunk_id, meta, meta.get("content_hash") or content_hash(chunk), fingerprint)
+
+    def _register(self, chunk: str, chunk_id: str, meta: dict, digest: str, fingerprint):
+        index = len(self.ids)
+        meta["content_hash"] = digest
+        if self.retain_chunks:
+            self.chunks.append(chunk)
+        self.ids.append(chunk_id)
+        self.metas.append(meta)
+        self._exact[digest] = index
+        self._fingerprints.append(fingerprint)
+        if fingerprint is not None:
+            for band, key in zip(self._bands, self._band_keys(fingerprint)):
+                band.setdefault(key, []).append(index)
+
+
+def deduplicate_chunks(chunks: list, ids: list, metas: list, max_distance: int = 3):
+    """Return (chunks, ids, metas, duplicates_removed) with duplicates folded into canonical chunks"""
+    deduplicator = ChunkDeduplicator(max_distance=max_distance)
+    for chunk, chunk_id, meta in zip(chunks, ids, metas):
+        deduplicator.add(chunk, chunk_id, meta)
+    return deduplicator.chunks, deduplicator.ids, deduplicator.metas, deduplicator.duplicates_removed
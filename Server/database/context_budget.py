@@ -0,0 +1,186 @@
+import os
+import re
+import math
+import time
+import asyncio
+import threading
+from utils import config
+
+_SENTENCE_SPLIT_RE = re.compile(r'[.!?]+')
+
+# A sentence is only cut down to fit when at least this much budget is left, unless nothing fitted at all
+MIN_TRUNCATED_TOKENS = 32
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def _tokenizer_file():
+    """tokenizer.json to load: the configured file, else LLM_TOKENIZER from the Hugging Face cache"""
+    if os.path.exists(config.LLM_TOKENIZER_FILE) or not config.LLM_TOKENIZER:
+        return config.LLM_TOKENIZER_FILE
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(config.LLM_TOKENIZER, "tokenizer.json", local_files_only=config.HF_HUB_OFFLINE)
+
+
+def get_tokenizer():
+    """Load the target model's tokenizer once; None when it is unavailable (offline installs)"""
+    global _tokenizer, _tokenizer_loaded
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            _tokenizer_loaded = True
+            try:
+                from tokenizers import Tokenizer
+                path = _tokenizer_file()
+                _tokenizer = Tokenizer.from_file(path)
+                print(f"✅ Loaded tokenizer for prompt budgeting: {path}")
+            except Exception as e:
+                print(f"⚠️ Could not load tokenizer {config.LLM_TOKENIZER or config.LLM_TOKENIZER_FILE}, "
+                      f"estimating token counts instead: {e}")
+    return _tokenizer
+
+
+async def load_tokenizer():
+    """Load the tokenizer at startup off the event loop, so no request waits on a download"""
+    await asyncio.get_running_loop().run_in_executor(None, get_tokenizer)
+
+
+def count_tokens_batch(texts: list) -> list:
+    """Token counts for several texts using the target model's tokenizer"""
+    if not texts:
+        return []
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        # Roughly four characters per token for English text with SentencePiece/BPE vocabularies
+        return [math.ceil(len(text) / 4) for text in texts]
+    return [len(encoding.ids) for encoding in tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+
+def count_tokens(text: str) -> int:
+    """Token count of a single text"""
+    return count_tokens_batch([text])[0]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of text that fits in max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return text[:max_tokens * 4].rstrip()
+    offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+    if len(offsets) <= max_tokens:
+        return text
+    return text[:offsets[max_tokens - 1][1]].rstrip()
+
+
+def merge_adjacent_chunks(chunks: list) -> list:
+    """
+    Merge chunks that are consecutive pieces of the same source file.
+    Blocks keep the rank of their best chunk so the most relevant source stays first.
+    """
+    blocks = []
+    by_source = {}
+    for chunk in chunks:
+        metadata = chunk.get("metadata") or {}
+        source = metadata.get("source")
+        index = metadata.get("chunk_index")
+        block = None
+        if source is not None and index is not None:
+            for candidate in by_source.get(source, []):
+                if candidate["first"] - 1 <= index <= candidate["last"] + 1:
+                    block = candidate
+                    break
+        if block is None:
+            block = {"pieces": [], "first": index, "last": index, "metadata": metadata}
+            blocks.append(block)
+            if source is not None and index is not None:
+                by_source.setdefault(source, []).append(block)
+        else:
+            block["first"] = min(block["first"], index)
+            block["last"] = max(block["last"], index)
+        block["pieces"].append((index if index is not None else 0, chunk["content"]))
+
+    merged = []
+    for block in blocks:
+        pieces = [content for _, content in sorted(block["pieces"], key=lambda piece: piece[0])]
+        merged.append({"content": "\n".join(pieces), "pieces": pieces, "metadata": block["metadata"]})
+    return merged
+
+
+def build_context(chunks: list, keywords: list, reserved_tokens: int = 0, budget: int = None):
+    """
+    Assemble the LLM context under a token budget.
+
+    Chunks are merged per source, split into sentences the same way extract_relevant_sentences
+    does, ranked by keyword hits and filled greedily; the best sentence that does not fit is cut to
+    the remaining budget. Selected sentences are emitted in their original order. Returns (context, stats).
+    """
+    started = time.perf_counter()
+    budget = config.PROMPT_TOKEN_BUDGET if budget is None else budget
+    available = max(budget - reserved_tokens, 0)
+
+    blocks = merge_adjacent_chunks(chunks)
+    full_context = "\n\n".join(block["content"] for block in blocks)
+
+    sentences = []
+    for block_rank, block in enumerate(blocks):
+        # Split each merged piece on its own so a chunk boundary never glues two sentences together
+        raw_sentences = [s for piece in block["pieces"] for s in _SENTENCE_SPLIT_RE.split(piece)]
+        for position, sentence in enumerate(raw_sentences):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            sentence_lower = sentence.lower()
+            hits = sum(1 for keyword in keywords if keyword in sentence_lower)
+            sentences.append({"block": block_rank, "position": position, "text": sentence, "hits": hits})
+
+    # Sentence lengths are counted as they will be emitted, with their terminating period
+    for sentence, tokens in zip(sentences, count_tokens_batch([s["text"] + "." for s in sentences])):
+        sentence["tokens"] = tokens
+
+    used = 0
+    selected = []
+    truncated = 0
+    for sentence in sorted(sentences, key=lambda s: (-s["hits"], s["block"], s["position"])):
+        if used + sentence["tokens"] <= available:
+            selected.append(sentence)
+            used += sentence["tokens"]
+        elif not truncated and (not selected or available - used >= MIN_TRUNCATED_TOKENS):
+            # Text without sentence punctuation (spreadsheet rows) is one long "sentence"; the best one that
+            # does not fit is cut to the remaining budget rather than leaving the LLM without context
+            limit = available - used - 1
+            text = truncate_to_tokens(sentence["text"], limit)
+            tokens = count_tokens(text + ".")
+            while text and tokens > available - used:
+                limit -= tokens - (available - used)
+                text = truncate_to_tokens(text, limit)
+                tokens = count_tokens(text + ".")
+            if text:
+                selected.append({**sentence, "text": text, "tokens": tokens})
+                used += tokens
+                truncated = 1
+
+    selected.sort(key=lambda s: (s["block"], s["position"]))
+    parts = []
+    for block_rank in sorted({s["block"] for s in selected}):
+        parts.append(". ".join(s["text"] for s in selected if s["block"] == block_rank) + ".")
+    context = "\n\n".join(parts)
+
+    original_tokens = count_tokens(full_context)
+    context_tokens = count_tokens(context)
+    tokens_saved = max(original_tokens - context_tokens, 0)
+    stats = {
+        "prompt_tokens": reserved_tokens + context_tokens,
+        "context_tokens": context_tokens,
+        "context_tokens_before_budget": original_tokens,
+        "token_budget": budget,
+        "sentences_kept": len(selected),
+        "sentences_dropped": len(sentences) - len(selected),
+        "sentences_truncated": truncated,
+        "chunks_merged": len(chunks) - len(blocks),
+        "estimated_time_saved_ms": round(tokens_saved * config.LLM_PREFILL_MS_PER_TOKEN, 1),
+        "assembly_time_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    return context, stats
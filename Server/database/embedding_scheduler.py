@@ -0,0 +1,82 @@
+import asyncio
+from collections import OrderedDict
+
+
+class EmbeddingScheduler:
+    """
+    Micro-batch query embeddings. Requests that arrive within max_delay_ms of the first pending one
+    (or until max_batch texts are pending) go to the model as one encode call on the executor, and
+    each awaiting coroutine gets its own row back. Recent results are kept in a small LRU.
+    """
+
+    def __init__(self, encode_batch, executor, max_batch: int = 16, max_delay_ms: float = 3, cache_size: int = 256):
+        self._encode_batch = encode_batch
+        self._executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.cache_size = cache_size
+        self._pending = {}
+        self._in_flight = {}
+        self._timer = None
+        self._cache = OrderedDict()
+        self.stats = {"requests": 0, "cache_hits": 0, "batches": 0, "texts_encoded": 0}
+
+    async def embed(self, text: str):
+        self.stats["requests"] += 1
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            self.stats["cache_hits"] += 1
+            return cached
+
+        loop = asyncio.get_running_loop()
+        # Identical texts waiting or already being encoded share one row of a batch
+        future = self._pending.get(text) or self._in_flight.get(text)
+        if future is None:
+            future = loop.create_future()
+            self._pending[text] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_delay, self._flush)
+        # Shielded so one cancelled caller does not fail the others waiting on the same text
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._in_flight.update(batch)
+        asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: dict):
+        texts = list(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            embeddings = await loop.run_in_executor(self._executor, self._encode_batch, texts)
+        except Exception as e:
+            for text, future in batch.items():
+                self._in_flight.pop(text, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["texts_encoded"] += len(texts)
+        for text, embedding in zip(texts, embeddings):
+            self._remember(text, embedding)
+            self._in_flight.pop(text, None)
+            future = batch[text]
+            if not future.done():
+                future.set_result(embedding)
+
+    def _remember(self, text: str, embedding):
+        if self.cache_size <= 0:
+            return
+        self._cache[text] = embedding
+        self._cache.move_to_end(text)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,172 @@
+import json
+import struct
+import socket
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils import config
+
+# Frame layout: two big-endian uint32 lengths (JSON header, binary payload) followed by both parts
+_FRAME_HEADER = struct.Struct("!II")
+
+# Instructor instructions for stored chunks and for user questions
+DOCUMENT_INSTRUCTION = "Represent the document for retrieval:"
+QUERY_INSTRUCTION = "Represent the question for retrieving supporting documents:"
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+
+def parse_address(address: str):
+    """Split 'host:port' into a (host, port) tuple"""
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def load_local_model():
+    """Load the Instructor model into this process"""
+    from InstructorEmbedding import INSTRUCTOR
+    print(f"🧠 Loading embedding model: {config.EMBEDDING_MODEL_NAME}")
+    return INSTRUCTOR(config.EMBEDDING_MODEL_NAME)
+
+
+def get_embedding_model():
+    """
+    Return the model used for embeddings, created on first use. When EMBEDDING_SERVICE_ADDRESS is set
+    (production mode) this is a client for the shared embedding service instead of an in-process model.
+    """
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            if config.EMBEDDING_SERVICE_ADDRESS:
+                print(f"🔌 Using shared embedding service at {config.EMBEDDING_SERVICE_ADDRESS}")
+                _embedding_model = RemoteEmbeddingModel(config.EMBEDDING_SERVICE_ADDRESS)
+            else:
+                _embedding_model = load_local_model()
+    return _embedding_model
+
+
+def embedding_dimension() -> int:
+    """Width of the vectors the configured model produces"""
+    model = get_embedding_model()
+    if hasattr(model, "get_sentence_embedding_dimension"):
+        return model.get_sentence_embedding_dimension()
+    if hasattr(model, "info"):
+        return model.info["dimension"]
+    return len(model.encode([[DOCUMENT_INSTRUCTION, "dimension probe"]])[0])
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        part = sock.recv(size - len(buffer))
+        if not part:
+            raise ConnectionError("Embedding service closed the connection")
+        buffer.extend(part)
+    return bytes(buffer)
+
+
+def _pack_frame(header: dict, payload: bytes = b"") -> bytes:
+    header_bytes = json.dumps(header).encode("utf-8")
+    return _FRAME_HEADER.pack(len(header_bytes), len(payload)) + header_bytes + payload
+
+
+class RemoteEmbeddingModel:
+    """Stand-in for INSTRUCTOR.encode that forwards requests to the shared embedding service"""
+
+    def __init__(self, address: str, timeout: float = 300):
+        self.address = parse_address(address)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _request(self, header: dict):
+        # One retry on a fresh connection covers a service restart between requests
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(_pack_frame(header))
+                header_size, payload_size = _FRAME_HEADER.unpack(_recv_exact(sock, _FRAME_HEADER.size))
+                response = json.loads(_recv_exact(sock, header_size))
+                payload = _recv_exact(sock, payload_size)
+                break
+            except (OSError, ConnectionError):
+                self._drop_connection()
+                if attempt:
+                    raise
+        if not response.get("ok"):
+            raise RuntimeError(f"Embedding service error: {response.get('error')}")
+        return response, payload
+
+    def ping(self) -> bool:
+        try:
+            self._request({"op": "ping"})
+            return True
+        except Exception:
+            return False
+
+    def encode(self, instructions, **kwargs):
+        response, payload = self._request({"op": "encode", "instructions": [list(pair) for pair in instructions]})
+        return np.frombuffer(payload, dtype=np.float32).reshape(response["shape"])
+
+
+async def _handle_client(reader, writer, model, executor):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                header_size, payload_size = _FRAME_HEADER.unpack(await reader.readexactly(_FRAME_HEADER.size))
+            except asyncio.IncompleteReadError:
+                break
+            request = json.loads(await reader.readexactly(header_size))
+            if payload_size:
+                await reader.readexactly(payload_size)
+
+            if request.get("op") == "ping":
+                writer.write(_pack_frame({"ok": True}))
+            elif request.get("op") == "encode":
+                try:
+                    embeddings = await loop.run_in_executor(executor, model.encode, request["instructions"])
+                    array = np.ascontiguousarray(embeddings, dtype=np.float32)
+                    writer.write(_pack_frame({"ok": True, "shape": list(array.shape)}, array.tobytes()))
+                except Exception as e:
+                    writer.write(_pack_frame({"ok": False, "error": str(e)}))
+            else:
+                writer.write(_pack_frame({"ok": False, "error": f"Unknown op: {request.get('op')}"}))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def _serve(address: str):
+    model = load_local_model()
+    # The model runs one forward pass at a time; torch parallelises inside the pass
+    executor = ThreadPoolExecutor(max_workers=1)
+    host, port = parse_address(address)
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_client(reader, writer, model, executor), host, port
+    )
+    print(f"✅ Embedding service listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def run_embedding_service(address: str):
+    """Process entry point: load the model once and serve encode requests for every worker"""
+    asyncio.run(_serve(address))
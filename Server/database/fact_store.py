@@ -0,0 +1,638 @@
+import os
+import re
+import csv
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import namedtuple
+from xml.etree import ElementTree
+from utils import config
+from .query_analysis import STOP_WORDS
+from .index_store import reading_generation
+
+# Numbers from structured files, kept inside every index generation so they go live together with it
+FACTS_FILE = "facts.sqlite3"
+FACT_EXTENSIONS = {'.xml', '.csv', '.tsv', '.tab', '.psv', '.xls', '.xlsx'}
+DELIMITERS = {'.csv': ',', '.tsv': '\t', '.tab': '\t', '.psv': '|'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    entity TEXT,
+    period TEXT,
+    category_path TEXT NOT NULL,
+    value REAL NOT NULL,
+    source TEXT NOT NULL,
+    document TEXT,
+    location TEXT
+);
+CREATE INDEX IF NOT EXISTS facts_period ON facts (period);
+CREATE INDEX IF NOT EXISTS facts_source ON facts (source);
+"""
+
+INSERT_BATCH_SIZE = 1000
+MAX_LABEL_CHARS = 80
+MAX_CITATIONS = 20
+
+Fact = namedtuple("Fact", ["entity", "period", "category_path", "value", "source", "document", "location"])
+
+PERIOD_FIELDS = {'period', 'date', 'year', 'month', 'quarter', 'fiscal_period', 'fiscal_year', 'as_of'}
+ENTITY_FIELDS = {'company', 'entity', 'organization', 'organisation', 'business', 'client', 'customer', 'vendor', 'supplier'}
+# Numeric identifiers that must never be summed
+EXCLUDED_FIELDS = {'id', 'day', 'number', 'no', 'code', 'zip', 'postcode', 'page'}
+EXCLUDED_SUFFIXES = ('_id', '_no', '_number', '_code')
+
+# Question words that pick the aggregate; questions without one and without a period go to RAG
+AGGREGATE_WORDS = {
+    'total': 'sum', 'sum': 'sum', 'overall': 'sum', 'combined': 'sum', 'altogether': 'sum', 'much': 'sum',
+    'average': 'avg', 'avg': 'avg', 'mean': 'avg',
+    'count': 'count', 'many': 'count',
+    'maximum': 'max', 'max': 'max', 'highest': 'max', 'largest': 'max', 'biggest': 'max',
+    'minimum': 'min', 'min': 'min', 'lowest': 'min', 'smallest': 'min',
+}
+AGGREGATE_LABELS = {'sum': 'Total', 'avg': 'Average', 'count': 'Number of', 'max': 'Highest', 'min': 'Lowest'}
+FILLER_WORDS = {
+    'we', 'our', 'us', 'i', 'my', 'spend', 'spent', 'spending', 'pay', 'paid', 'cost', 'value', 'amount', 'figure',
+    'period', 'month', 'year', 'quarter', 'fiscal', 'all', 'as', 'per', 'there', 'it', 'its', 'during',
+    'between', 'list', 'report', 'reported',
+}
+
+MONTHS = {
+    name: index for index, names in enumerate((
+        ('january', 'jan'), ('february', 'feb'), ('march', 'mar'), ('april', 'apr'), ('may',), ('june', 'jun'),
+        ('july', 'jul'), ('august', 'aug'), ('september', 'sep', 'sept'), ('october', 'oct'),
+        ('november', 'nov'), ('december', 'dec'),
+    ), 1) for name in names
+}
+_MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+
+_NUMBER_RE = re.compile(r"^(\()?\s*(-)?\s*[$€£]?\s*(-)?(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?\s*(\))?$")
+_ISO_PERIOD_RE = re.compile(r"^(\d{4})(?:[-/](\d{1,2})(?:[-/](\d{1,2}))?)?(?:[T ][\d:.]+Z?)?$")
+_QUARTER_RE = re.compile(r"^(?:(\d{4})[-\s]?q([1-4])|q([1-4])[-\s]?(\d{4}))$", re.IGNORECASE)
+_MONTH_YEAR_RE = re.compile(rf"^({_MONTH_NAMES})\.?[\s-]+(\d{{4}})$", re.IGNORECASE)
+
+# Periods as they are written in questions, most specific first
+_QUESTION_PERIOD_RES = (
+    (re.compile(r"\b(\d{4})-(\d{2})(?:-(\d{2}))?\b"), lambda m: "-".join(part for part in m.groups() if part)),
+    (re.compile(r"\b(\d{4})[-\s]?q([1-4])\b"), lambda m: f"{m.group(1)}-Q{m.group(2)}"),
+    (re.compile(r"\bq([1-4])[-\s]?(\d{4})\b"), lambda m: f"{m.group(2)}-Q{m.group(1)}"),
+    (re.compile(rf"\b({_MONTH_NAMES})\.?\s+(\d{{4}})\b"), lambda m: f"{m.group(2)}-{MONTHS[m.group(1)]:02d}"),
+    (re.compile(r"\b((?:19|20)\d{2})\b"), lambda m: m.group(1)),
+)
+_WORD_RE = re.compile(r"[a-z][a-z0-9]*")
+
+
+def parse_number(text):
+    """Accounting-style number ("1,200.00", "$ 45", "(85.00)" for negatives) or None"""
+    match = _NUMBER_RE.match(text.strip()) if text else None
+    if not match:
+        return None
+    opening, sign, inner_sign, digits, fraction, closing = match.groups()
+    if bool(opening) != bool(closing) or (sign and inner_sign):
+        return None
+    value = float(digits.replace(",", "") + (fraction or ""))
+    return -value if opening or sign or inner_sign else value
+
+
+def normalize_period(text: str):
+    """YYYY, YYYY-MM, YYYY-MM-DD or YYYY-Qn for the period notations found in reports, else None"""
+    text = text.strip()
+    match = _ISO_PERIOD_RE.match(text)
+    if match:
+        year, month, day = match.groups()
+        if month and not 1 <= int(month) <= 12:
+            return None
+        return "-".join([year] + [f"{int(part):02d}" for part in (month, day) if part])
+    match = _QUARTER_RE.match(text)
+    if match:
+        return f"{match.group(1) or match.group(4)}-Q{match.group(2) or match.group(3)}"
+    match = _MONTH_YEAR_RE.match(text)
+    if match:
+        return f"{match.group(2)}-{MONTHS[match.group(1).lower()]:02d}"
+    return None
+
+
+def _field_name(name) -> str:
+    return re.sub(r"\s+", "_", str(name).strip().lower()) or "value"
+
+
+def _is_period_field(name: str) -> bool:
+    return name in PERIOD_FIELDS or name.endswith(('_date', '_period'))
+
+
+def _is_excluded_field(name: str) -> bool:
+    return name in EXCLUDED_FIELDS or name.endswith(EXCLUDED_SUFFIXES)
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def terms(text: str) -> set:
+    """Singular lower-case words; underscores and slashes separate words like spaces do"""
+    return {_stem(word) for word in _WORD_RE.findall((text or "").lower())}
+
+
+def _local_name(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+# --- Extraction -------------------------------------------------------------------------------------
+
+def _xml_facts(file_path: str):
+    """
+    Numeric leaf elements with their element path as category. The other leaves describe their record:
+    period and entity fields (and period attributes) apply to the record and everything below it, other
+    short texts become part of the category path of the record's numbers.
+    """
+    source = os.path.abspath(file_path)
+    stack = []
+    document = None
+    for event, element in ElementTree.iterparse(file_path, events=("start", "end")):
+        if event == "start":
+            tag = _local_name(element.tag)
+            index = 1
+            if stack:
+                parent = stack[-1]
+                parent["children"] += 1
+                index = parent["counts"][tag] = parent["counts"].get(tag, 0) + 1
+            else:
+                document = tag
+            period = None
+            for name, value in element.attrib.items():
+                if _is_period_field(_field_name(_local_name(name))):
+                    period = normalize_period(value) or period
+            stack.append({"tag": tag, "index": index, "element": element, "period": period, "entity": None,
+                          "labels": [], "numbers": [], "children": 0, "counts": {}})
+            continue
+
+        frame = stack.pop()
+        if frame["children"] == 0:
+            if stack:
+                _xml_leaf(stack, frame, (element.text or "").strip())
+        elif frame["numbers"]:
+            # The record is closed, so its labels, period and entity are known for all of its numbers
+            path = [f["tag"] for f in stack[1:]] + ([frame["tag"]] if stack else [])
+            period = frame["period"] or next((f["period"] for f in reversed(stack) if f["period"]), None)
+            entity = frame["entity"] or next((f["entity"] for f in reversed(stack) if f["entity"]), None)
+            for name, value, location, leaf_period in frame["numbers"]:
+                yield Fact(entity, leaf_period or period, "/".join(path + frame["labels"] + [name]),
+                           value, source, document, location)
+
+        # Closed elements are detached from their parent so memory stays flat on huge documents
+        element.clear()
+        if stack:
+            stack[-1]["element"].remove(element)
+
+
+def _xml_leaf(stack: list, leaf: dict, text: str):
+    parent = stack[-1]
+    name = _field_name(leaf["tag"])
+    if not text:
+        return
+    value = parse_number(text)
+    period = normalize_period(text) if value is None or _is_period_field(name) else None
+    if period and (_is_period_field(name) or value is None):
+        parent["period"] = period
+    elif name in ENTITY_FIELDS:
+        parent["entity"] = text
+    elif value is not None:
+        if not _is_excluded_field(name):
+            location = "/" + "/".join(
+                f["tag"] if f["index"] == 1 else f"{f['tag']}[{f['index']}]" for f in stack + [leaf]
+            )
+            parent["numbers"].append((leaf["tag"], value, location, leaf["period"]))
+    elif len(text) <= MAX_LABEL_CHARS:
+        parent["labels"].append(text.replace("/", " "))
+
+
+def _cell_text(cell) -> str:
+    if isinstance(cell, float) and cell.is_integer():
+        return str(int(cell))
+    return str(cell).strip()
+
+
+def _table_facts(rows, source: str, document: str):
+    """
+    Facts from a table whose first row is a header (unless it holds numbers). Every numeric cell is a
+    fact named after its column; the row's text cells form the category path, and period and entity
+    columns (or date cells) give its period and entity.
+    """
+    header = None
+    for row_number, cells in rows:
+        if not any(_cell_text(cell) for cell in cells):
+            continue
+        if header is None:
+            if not any(isinstance(cell, float) or parse_number(cell) is not None or normalize_period(_cell_text(cell))
+                       for cell in cells if _cell_text(cell)):
+                header = [_field_name(cell) for cell in cells]
+                continue
+            header = []
+        fields = header + [f"column_{index + 1}" for index in range(len(header), len(cells))]
+
+        labels, numbers, period, entity = [], [], None, None
+        for field, cell in zip(fields, cells):
+            text = _cell_text(cell)
+            if not text:
+                continue
+            value = cell if isinstance(cell, float) else parse_number(text)
+            if (_is_period_field(field) or value is None) and normalize_period(text):
+                period = normalize_period(text)
+            elif field in ENTITY_FIELDS:
+                entity = text
+            elif value is not None:
+                if not _is_excluded_field(field):
+                    numbers.append((field, value))
+            elif len(text) <= MAX_LABEL_CHARS:
+                labels.append(text.replace("/", " "))
+        for field, value in numbers:
+            yield Fact(entity, period, "/".join(labels + [field]), value, source, document, f"row {row_number}")
+
+
+def _delimited_facts(file_path: str, delimiter: str):
+    with open(file_path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        rows = enumerate(csv.reader(f, delimiter=delimiter), 1)
+        yield from _table_facts(rows, os.path.abspath(file_path), os.path.splitext(os.path.basename(file_path))[0])
+
+
+def _workbook_facts(file_path: str):
+    import xlrd
+
+    book = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        for index in range(book.nsheets):
+            sheet = book.sheet_by_index(index)
+
+            def rows():
+                for row in range(sheet.nrows):
+                    cells = []
+                    for cell in sheet.row(row):
+                        if cell.ctype == xlrd.XL_CELL_DATE:
+                            year, month, day = xlrd.xldate_as_tuple(cell.value, book.datemode)[:3]
+                            cells.append(f"{year:04d}-{month:02d}-{day:02d}")
+                        elif cell.ctype == xlrd.XL_CELL_NUMBER:
+                            cells.append(float(cell.value))
+                        else:
+                            cells.append(str(cell.value))
+                    yield row + 1, cells
+
+            yield from _table_facts(rows(), os.path.abspath(file_path), sheet.name)
+            book.unload_sheet(index)
+    finally:
+        book.release_resources()
+
+
+def iter_facts(file_path: str):
+    """Numeric facts of an XML, delimited or workbook file, streamed like the text extractors"""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.xml':
+        return _xml_facts(file_path)
+    if extension in DELIMITERS:
+        return _delimited_facts(file_path, DELIMITERS[extension])
+    if extension in ('.xls', '.xlsx'):
+        return _workbook_facts(file_path)
+    return iter(())
+
+
+class FactWriter:
+    """Fill the fact table of a staging generation; add_file may be called from several threads"""
+
+    def __init__(self, generation_path: str):
+        self.path = os.path.join(generation_path, FACTS_FILE)
+        self.facts_added = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _insert(self, facts: list):
+        with self._lock:
+            self._conn.executemany("INSERT INTO facts VALUES (?, ?, ?, ?, ?, ?, ?)", facts)
+            self._conn.commit()
+            self.facts_added += len(facts)
+
+    def add_file(self, file_path: str) -> int:
+        """Extract and store the facts of one file; returns how many it had"""
+        if os.path.splitext(file_path)[1].lower() not in FACT_EXTENSIONS:
+            return 0
+        source = os.path.abspath(file_path)
+        count, batch = 0, []
+        try:
+            for fact in iter_facts(file_path):
+                batch.append(fact)
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    self._insert(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self._insert(batch)
+                count += len(batch)
+        except Exception as e:
+            # A file that cannot be parsed to the end contributes no facts at all
+            print(f"    ⚠️ No facts extracted from {os.path.basename(file_path)}: {e}")
+            with self._lock:
+                self._conn.execute("DELETE FROM facts WHERE source = ?", (source,))
+                self._conn.commit()
+                self.facts_added -= count
+            return 0
+
+        with self._lock:
+            # An entity named once in a document (e.g. its <company>) applies to all of its facts
+            self._conn.execute(
+                "UPDATE facts SET entity = (SELECT entity FROM facts WHERE source = ?1 AND entity IS NOT NULL "
+                "GROUP BY entity ORDER BY COUNT(*) DESC LIMIT 1) WHERE source = ?1 AND entity IS NULL",
+                (source,),
+            )
+            self._conn.commit()
+        if count:
+            print(f"    🔢 {os.path.basename(file_path)}: {count} facts")
+        return count
+
+    def copy_from(self, generation_path: str, exclude_sources=()):
+        """Carry over the facts of another generation, except those of the given sources"""
+        path = os.path.join(generation_path, FACTS_FILE)
+        if not os.path.exists(path):
+            return
+        with self._lock:
+            self._conn.execute("ATTACH DATABASE ? AS previous", (path,))
+            self._conn.execute("CREATE TEMP TABLE excluded_sources (source TEXT PRIMARY KEY)")
+            self._conn.executemany("INSERT OR IGNORE INTO excluded_sources VALUES (?)",
+                                   [(os.path.abspath(source),) for source in exclude_sources])
+            cursor = self._conn.execute(
+                "INSERT INTO facts SELECT * FROM previous.facts WHERE source NOT IN (SELECT source FROM excluded_sources)"
+            )
+            self.facts_added += cursor.rowcount
+            self._conn.commit()
+            self._conn.execute("DROP TABLE excluded_sources")
+            self._conn.execute("DETACH DATABASE previous")
+
+    def close(self):
+        self._conn.close()
+
+
+# --- Queries ----------------------------------------------------------------------------------------
+
+def question_period(question: str):
+    """The first period mentioned in the question and the question without it"""
+    lowered = question.lower()
+    for pattern, normalize in _QUESTION_PERIOD_RES:
+        match = pattern.search(lowered)
+        if match:
+            return normalize(match), lowered[:match.start()] + " " + lowered[match.end():]
+    return None, lowered
+
+
+def _period_prefixes(period: str) -> list:
+    # A quarter also covers the months and days inside it
+    if period and "-Q" in period:
+        year, quarter = period.split("-Q")
+        first = (int(quarter) - 1) * 3 + 1
+        return [period] + [f"{year}-{month:02d}" for month in range(first, first + 3)]
+    return [period]
+
+
+def parse_question(question: str):
+    """(aggregate, period, [query words]) or None when the question is not an aggregate or lookup question"""
+    period, rest = question_period(question)
+    words = _WORD_RE.findall(rest)
+    aggregate = next((AGGREGATE_WORDS[word] for word in words if word in AGGREGATE_WORDS), None)
+    if aggregate is None and period is None:
+        return None
+    query_words = [
+        word for word in words
+        if word not in STOP_WORDS and word not in AGGREGATE_WORDS and word not in FILLER_WORDS and word not in MONTHS
+    ]
+    if not query_words:
+        return None
+    return aggregate, period, query_words
+
+
+def _is_rollup(category_path: str) -> bool:
+    name = category_path.rpartition("/")[2].lower()
+    return name == "total" or name.startswith(("total_", "subtotal")) or name.endswith("_total")
+
+
+def _collapse_descendants(facts: list) -> list:
+    """
+    A matched fact whose value is the sum of the matched facts below it (same name, source and period,
+    category further down the path) stands for them; keeping both would count them twice
+    """
+    dropped = set()
+    for fact in facts:
+        parent, _, name = fact.category_path.rpartition("/")
+        below = [
+            index for index, other in enumerate(facts)
+            if other.source == fact.source and other.period == fact.period
+            and other.category_path.rpartition("/")[2] == name
+            and other.category_path.rpartition("/")[0].startswith(parent + "/" if parent else "")
+            and other.category_path != fact.category_path
+        ]
+        if below and abs(sum(facts[index].value for index in below) - fact.value) < 0.005:
+            dropped.update(below)
+    return [fact for index, fact in enumerate(facts) if index not in dropped]
+
+
+def select_facts(rows: list, query_words: list) -> list:
+    """
+    Facts whose category path, document, entity or file name cover every query term, keeping those
+    whose own category path matches the most terms. Roll-up totals are dropped when parts from the
+    same file matched too, so sums do not count anything twice.
+    """
+    query_terms = {_stem(word) for word in query_words}
+    best, selected = 0, []
+    for fact in rows:
+        path_terms = terms(fact.category_path)
+        context_terms = terms(fact.document) | terms(fact.entity) | terms(os.path.splitext(os.path.basename(fact.source))[0])
+        direct = len(query_terms & path_terms)
+        if not direct or not query_terms <= path_terms | context_terms:
+            continue
+        if direct > best:
+            best, selected = direct, []
+        if direct == best:
+            selected.append(fact)
+
+    selected = _collapse_descendants(selected)
+    by_source = {}
+    for fact in selected:
+        by_source.setdefault(fact.source, []).append(fact)
+    kept = set()
+    for facts in by_source.values():
+        # Another file's details say nothing about what this file's total covers
+        parts = [id(fact) for fact in facts if not _is_rollup(fact.category_path)]
+        kept.update(parts or [id(fact) for fact in facts])
+    return [fact for fact in selected if id(fact) in kept]
+
+
+def _like_stem(term: str) -> str:
+    # "utility" has to find "utilities" as well
+    return term[:-1] if term.endswith("y") and len(term) > 3 else term
+
+
+def query_facts(generation_path: str, question: str):
+    """Answer an aggregate or lookup question from the fact table, or None to fall back to RAG"""
+    parsed = parse_question(question)
+    path = os.path.join(generation_path, FACTS_FILE)
+    if parsed is None or not os.path.exists(path):
+        return None
+    aggregate, period, query_words = parsed
+
+    # SQLite narrows the rows down to the period and at least one matching term; scoring happens here
+    clauses, params = [], []
+    if period:
+        prefixes = _period_prefixes(period)
+        clauses.append("(" + " OR ".join("period LIKE ?" for _ in prefixes) + ")")
+        params.extend(f"{prefix}%" for prefix in prefixes)
+    like_terms = sorted({_like_stem(_stem(word)) for word in query_words})
+    clauses.append("(" + " OR ".join("category_path LIKE ?" for _ in like_terms) + ")")
+    params.extend(f"%{term}%" for term in like_terms)
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [Fact(*row) for row in conn.execute(
+            f"SELECT entity, period, category_path, value, source, document, location FROM facts WHERE {' AND '.join(clauses)}",
+            params,
+        )]
+    finally:
+        conn.close()
+
+    facts = select_facts(rows, query_words)
+    if not facts:
+        return None
+    return aggregate, period, query_words, facts
+
+
+def _format_value(value: float) -> str:
+    return f"{value:,.2f}"
+
+
+def _period_span(period: str):
+    """(first day, last day) covered by a normalized period, as comparable strings"""
+    if "-Q" in period:
+        year, quarter = period.split("-Q")
+        first = (int(quarter) - 1) * 3 + 1
+        return f"{year}-{first:02d}-01", f"{year}-{first + 2:02d}-31"
+    if len(period) == 4:
+        return f"{period}-01-01", f"{period}-12-31"
+    if len(period) == 7:
+        return f"{period}-01", f"{period}-31"
+    return period, period
+
+
+def _granularity(period: str) -> str:
+    if not period:
+        return ""
+    if "-Q" in period:
+        return "quarter"
+    return {4: "year", 7: "month"}.get(len(period), "day")
+
+
+def _overlapping_groups(facts: list):
+    """
+    Facts grouped by source and period granularity when a coarser period among them contains a finer one
+    (a 2024-Q1 total next to 2024-03 details), else None. Such figures report the same spending twice.
+    """
+    spans = {fact.period: _period_span(fact.period) for fact in facts if fact.period}
+    overlap = any(
+        outer != inner and spans[outer][0] <= spans[inner][0] and spans[inner][1] <= spans[outer][1]
+        for outer in spans for inner in spans
+    )
+    if not overlap:
+        return None
+    groups = {}
+    for fact in facts:
+        groups.setdefault((fact.source, _granularity(fact.period)), []).append(fact)
+    return groups
+
+
+def _scope(facts: list) -> str:
+    """
+    The periods the facts are for. A requested period is not echoed: "2024" also matches a 2024-Q1
+    figure, which is not a figure for the whole year.
+    """
+    periods = sorted({fact.period for fact in facts if fact.period})
+    if len(periods) == 1 and all(fact.period for fact in facts):
+        return f" for {periods[0]}"
+    if len(periods) > 1:
+        return f" across {len(periods)} periods ({periods[0]} to {periods[-1]})"
+    return ""
+
+
+def _headline(aggregate, subject: str, scope: str, facts: list) -> str:
+    values = [fact.value for fact in facts]
+    if len(facts) == 1 and aggregate != "count":
+        label = f"{AGGREGATE_LABELS[aggregate]} {subject}" if aggregate else subject.capitalize()
+        return f"{label}{scope}: {_format_value(facts[0].value)}"
+    if aggregate == "count":
+        return f"{AGGREGATE_LABELS[aggregate]} {subject}{scope}: {len(facts)}"
+    if aggregate in ("max", "min"):
+        fact = (max if aggregate == "max" else min)(facts, key=lambda fact: fact.value)
+        return f"{AGGREGATE_LABELS[aggregate]} {subject}{scope}: {_format_value(fact.value)} ({fact.category_path})"
+    if aggregate == "avg":
+        return f"{AGGREGATE_LABELS[aggregate]} {subject}{scope}: {_format_value(sum(values) / len(values))} over {len(values)} values"
+    return f"{AGGREGATE_LABELS['sum']} {subject}{scope}: {_format_value(sum(values))} from {len(values)} values"
+
+
+def format_fact_answer(aggregate, period: str, query_words: list, facts: list) -> dict:
+    """
+    Headline with the aggregate (a lookup when aggregate is None) followed by one citation per fact.
+    The headline names the periods the facts are for, which can be narrower than the period asked for.
+    Figures whose periods overlap are aggregated per source and period granularity instead of together.
+    """
+    subject = " ".join(query_words)
+    groups = _overlapping_groups(facts) if len(facts) > 1 else None
+    if groups is None:
+        headline, breakdown = _headline(aggregate, subject, _scope(facts), facts), ""
+    else:
+        within = f" within {period}" if period else ""
+        headline = f"{subject.capitalize()} is reported for overlapping periods{within}, so the figures are not combined"
+        breakdown = "\n" + "\n".join(
+            f"- {os.path.basename(source)}{f' by {granularity}' if granularity else ''}: "
+            f"{_headline(aggregate, subject, _scope(group), group)}"
+            for (source, granularity), group in groups.items()
+        )
+
+    citations = [
+        f"- {os.path.basename(fact.source)} › {fact.location or fact.category_path}"
+        f"{f' ({fact.period})' if fact.period else ''}: {_format_value(fact.value)}"
+        for fact in facts[:MAX_CITATIONS]
+    ]
+    if len(facts) > MAX_CITATIONS:
+        citations.append(f"- … and {len(facts) - MAX_CITATIONS} more")
+    entities = sorted({fact.entity for fact in facts if fact.entity})
+    answer = headline + (f" ({', '.join(entities)})" if entities else "") + breakdown + "\n\nSources:\n" + "\n".join(citations)
+
+    return {
+        "answer": answer,
+        "sources": [
+            {"source": fact.source, "category_path": fact.category_path, "period": fact.period,
+             "entity": fact.entity, "value": fact.value, "location": fact.location}
+            for fact in facts
+        ],
+    }
+
+
+async def answer_from_facts(question: str):
+    """Structured answer with citations for aggregate and lookup questions, or None"""
+    if not config.FACTS_ENABLED:
+        return None
+    started = time.perf_counter()
+
+    def run():
+        with reading_generation() as generation:
+            return query_facts(generation.path, question)
+
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(None, run)
+    except sqlite3.Error as e:
+        print(f"⚠️ Fact table query failed, falling back to document search: {e}")
+        return None
+    if result is None:
+        return None
+    response = format_fact_answer(*result)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    print(f"🔢 Answered from {len(response['sources'])} facts in {elapsed_ms} ms")
+    response["usage"] = {"structured_query": True, "facts_matched": len(response["sources"]), "elapsed_ms": elapsed_ms}
+    return response
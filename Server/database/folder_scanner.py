@@ -0,0 +1,139 @@
+import os
+import stat
+from fnmatch import fnmatch
+from utils import config
+
+SUPPORTED_EXTENSIONS = {'.csv', '.doc', '.docx', '.eml', '.epub', '.gif', '.htm', '.html', '.jpeg', '.jpg', '.json', '.log', '.mp3', '.msg', '.odt', '.ogg', '.pdf', '.png', '.pptx', '.ps', '.psv', '.rtf', '.tab', '.tff', '.tif', '.tiff', '.tsv', '.txt', '.wav', '.xls', '.xlsx', '.xml'}
+
+# Editor, Office and download leftovers that are never worth extracting
+TEMP_FILE_PREFIXES = ('~$', '.~lock.')
+TEMP_FILE_SUFFIXES = ('.tmp', '.temp', '.swp', '.part', '.crdownload', '~')
+
+# Symlink policies: 'none' skips every link, 'files' follows file links only (like os.walk), 'all' follows both
+SYMLINK_POLICIES = ('none', 'files', 'all')
+
+
+class ScanRules:
+    """What a folder scan should pick up"""
+
+    def __init__(self, include=None, exclude=None, max_file_size=0, max_depth=-1, symlinks='files', skip_hidden=True):
+        if symlinks not in SYMLINK_POLICIES:
+            raise ValueError(f"symlinks must be one of {SYMLINK_POLICIES}, got {symlinks!r}")
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.max_file_size = max_file_size
+        self.max_depth = max_depth
+        self.symlinks = symlinks
+        self.skip_hidden = skip_hidden
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            include=config.SCAN_INCLUDE,
+            exclude=config.SCAN_EXCLUDE,
+            max_file_size=config.SCAN_MAX_FILE_SIZE_MB * 1024 * 1024,
+            max_depth=config.SCAN_MAX_DEPTH,
+            symlinks=config.SCAN_SYMLINKS,
+            skip_hidden=config.SCAN_SKIP_HIDDEN,
+        )
+
+    def matches(self, patterns, relative_path: str, name: str) -> bool:
+        return any(fnmatch(relative_path, pattern) or fnmatch(name, pattern) for pattern in patterns)
+
+
+def _is_hidden(entry) -> bool:
+    if entry.name.startswith('.'):
+        return True
+    if os.name != "nt":
+        return False
+    # Windows keeps "hidden" as a file attribute rather than a name convention; scandir already has it there
+    attributes = getattr(entry.stat(follow_symlinks=False), "st_file_attributes", 0)
+    return bool(attributes & getattr(stat, "FILE_ATTRIBUTE_HIDDEN", 0))
+
+
+def _is_temp_file(name: str) -> bool:
+    lower = name.lower()
+    return lower.startswith(TEMP_FILE_PREFIXES) or lower.endswith(TEMP_FILE_SUFFIXES)
+
+
+def new_scan_stats():
+    return {
+        "files_found": 0,
+        "skipped_unsupported": 0,
+        "skipped_excluded": 0,
+        "skipped_hidden_or_temp": 0,
+        "skipped_too_large": 0,
+        "skipped_symlinks": 0,
+        "errors": 0,
+    }
+
+
+def scan_folder(root: str, rules: ScanRules = None, stats: dict = None):
+    """
+    Lazily yield supported files under root. Built on os.scandir so directory entries carry their
+    type without an extra stat per file, and files are yielded as soon as their directory is read.
+    """
+    rules = rules or ScanRules()
+    stats = stats if stats is not None else new_scan_stats()
+    visited = set()
+    stack = [(root, 0)]
+
+    while stack:
+        directory, depth = stack.pop()
+        try:
+            if rules.symlinks == 'all':
+                # Following directory links can loop back on itself
+                info = os.stat(directory)
+                key = (info.st_dev, info.st_ino)
+                if key in visited:
+                    continue
+                visited.add(key)
+            with os.scandir(directory) as entries:
+                subdirectories = []
+                for entry in entries:
+                    try:
+                        if rules.skip_hidden and (_is_hidden(entry) or _is_temp_file(entry.name)):
+                            stats["skipped_hidden_or_temp"] += 1
+                            continue
+
+                        is_link = entry.is_symlink()
+                        relative_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+
+                        if entry.is_dir(follow_symlinks=True):
+                            if is_link and rules.symlinks != 'all':
+                                stats["skipped_symlinks"] += 1
+                            elif rules.max_depth < 0 or depth < rules.max_depth:
+                                if not rules.matches(rules.exclude, relative_path, entry.name):
+                                    subdirectories.append(entry.path)
+                            continue
+
+                        if is_link and rules.symlinks == 'none':
+                            stats["skipped_symlinks"] += 1
+                            continue
+                        if not entry.is_file(follow_symlinks=True):
+                            continue
+
+                        if os.path.splitext(entry.name)[1].lower() not in SUPPORTED_EXTENSIONS:
+                            stats["skipped_unsupported"] += 1
+                            continue
+                        if rules.matches(rules.exclude, relative_path, entry.name) or (
+                            rules.include and not rules.matches(rules.include, relative_path, entry.name)
+                        ):
+                            stats["skipped_excluded"] += 1
+                            continue
+                        if rules.max_file_size and entry.stat(follow_symlinks=True).st_size > rules.max_file_size:
+                            stats["skipped_too_large"] += 1
+                            continue
+
+                        stats["files_found"] += 1
+                        yield entry.path
+                    except OSError as e:
+                        stats["errors"] += 1
+                        print(f"⚠️ Could not read {entry.path}: {e}")
+
+                # Depth-first in name order keeps runs over the same tree reproducible
+                for path in sorted(subdirectories, reverse=True):
+                    stack.append((path, depth + 1))
+        except OSError as e:
+            stats["errors"] += 1
+            print(f"⚠️ Could not scan {directory}: {e}")
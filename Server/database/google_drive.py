@@ -0,0 +1,615 @@
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+import shutil
+import httpx
+from utils import config
+from .folder_scanner import SUPPORTED_EXTENSIONS, ScanRules
+from .index_store import (
+    index_write_lock, get_live_generation, create_staging_generation, discard_generation, activate_generation,
+    generation_content_id
+)
+from .chroma_setup_database import GenerationWriter, ingest_file
+from .fact_store import FactWriter
+
+DRIVE_SCOPE = "https://www.googleapis.com/auth/drive.readonly"
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+FILE_FIELDS = "id,name,mimeType,parents,trashed,size,md5Checksum,modifiedTime"
+
+# Native Google formats have no bytes to download; they are exported to a format textract reads
+EXPORT_FORMATS = {
+    "application/vnd.google-apps.document": ("text/plain", ".txt"),
+    "application/vnd.google-apps.spreadsheet": ("text/csv", ".csv"),
+    "application/vnd.google-apps.presentation": ("text/plain", ".txt"),
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Rows per page when reading the live collection, so a sync never holds all of it in memory
+READ_PAGE_SIZE = 1000
+
+_FOLDER_URL_RE = re.compile(r'/folders/([\w-]+)|[?&]id=([\w-]+)')
+_UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def parse_folder_id(value: str) -> str:
+    """Accept a bare folder id or a Drive folder URL"""
+    value = value.strip()
+    match = _FOLDER_URL_RE.search(value)
+    if match:
+        return match.group(1) or match.group(2)
+    if not value or "/" in value:
+        raise ValueError(f"Not a Google Drive folder id or URL: {value!r}")
+    return value
+
+
+class DriveClient:
+    """
+    Small async Drive v3 client: folder listings, the changes feed and resumable downloads.
+    All requests share one httpx connection pool capped at GOOGLE_DRIVE_MAX_CONNECTIONS.
+    """
+
+    def __init__(self, base_url: str = None, max_connections: int = None, timeout: float = None, max_retries: int = None):
+        self.base_url = (base_url or config.GOOGLE_DRIVE_API_URL).rstrip("/")
+        self.max_retries = config.GOOGLE_DRIVE_MAX_RETRIES if max_retries is None else max_retries
+        max_connections = max_connections or config.GOOGLE_DRIVE_MAX_CONNECTIONS
+        self._http = httpx.AsyncClient(
+            timeout=timeout or config.GOOGLE_DRIVE_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            follow_redirects=True,
+        )
+        self._credentials = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._http.aclose()
+
+    async def _auth_headers(self) -> dict:
+        if config.GOOGLE_DRIVE_CREDENTIALS_FILE:
+            if self._credentials is None:
+                from google.oauth2 import service_account
+                self._credentials = service_account.Credentials.from_service_account_file(
+                    config.GOOGLE_DRIVE_CREDENTIALS_FILE, scopes=[DRIVE_SCOPE]
+                )
+            if not self._credentials.valid:
+                from google.auth.transport.requests import Request
+                await asyncio.get_running_loop().run_in_executor(None, self._credentials.refresh, Request())
+            return {"Authorization": f"Bearer {self._credentials.token}"}
+        if config.GOOGLE_DRIVE_ACCESS_TOKEN:
+            return {"Authorization": f"Bearer {config.GOOGLE_DRIVE_ACCESS_TOKEN}"}
+        return {}
+
+    async def _backoff(self, attempt: int, response: httpx.Response = None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = min(8.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+        await asyncio.sleep(delay)
+
+    async def _get_json(self, path: str, params: dict = None) -> dict:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._http.get(self.base_url + path, params=params, headers=await self._auth_headers())
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                await self._backoff(attempt)
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                await self._backoff(attempt, response)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    async def list_children(self, folder_id: str) -> list:
+        items, page_token = [], None
+        while True:
+            params = {
+                "q": f"'{folder_id}' in parents and trashed = false",
+                "fields": f"nextPageToken,files({FILE_FIELDS})",
+                "pageSize": 1000,
+                "supportsAllDrives": "true",
+                "includeItemsFromAllDrives": "true",
+            }
+            if page_token:
+                params["pageToken"] = page_token
+            page = await self._get_json("/files", params)
+            items.extend(page.get("files", []))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return items
+
+    async def list_tree(self, folder_id: str):
+        """Return ({file_id: file}, {folder_id: parent_id}) for everything below folder_id"""
+        files, folders = {}, {folder_id: None}
+        level = [folder_id]
+        while level:
+            # Every folder of one level is listed concurrently
+            listings = await asyncio.gather(*(self.list_children(parent) for parent in level))
+            next_level = []
+            for parent, items in zip(level, listings):
+                for item in items:
+                    if item.get("mimeType") == FOLDER_MIME_TYPE:
+                        if item["id"] not in folders:
+                            folders[item["id"]] = parent
+                            next_level.append(item["id"])
+                    else:
+                        files[item["id"]] = item
+            level = next_level
+        return files, folders
+
+    async def get_start_page_token(self) -> str:
+        response = await self._get_json("/changes/startPageToken", {"supportsAllDrives": "true"})
+        return response["startPageToken"]
+
+    async def list_changes(self, page_token: str):
+        """Return (changes, next_start_page_token) for everything that changed since page_token"""
+        changes = []
+        while True:
+            page = await self._get_json("/changes", {
+                "pageToken": page_token,
+                "fields": f"nextPageToken,newStartPageToken,changes(fileId,removed,file({FILE_FIELDS}))",
+                "pageSize": 1000,
+                "includeRemoved": "true",
+                "supportsAllDrives": "true",
+                "includeItemsFromAllDrives": "true",
+            })
+            changes.extend(page.get("changes", []))
+            if page.get("newStartPageToken"):
+                return changes, page["newStartPageToken"]
+            page_token = page["nextPageToken"]
+
+    async def download(self, item: dict, destination: str) -> str:
+        """
+        Download a file to destination through a .part file. An interrupted transfer (including one
+        left behind by an earlier sync) resumes with a Range request instead of starting over.
+        """
+        export = EXPORT_FORMATS.get(item.get("mimeType"))
+        if export:
+            url, params = f"{self.base_url}/files/{item['id']}/export", {"mimeType": export[0]}
+        else:
+            url, params = f"{self.base_url}/files/{item['id']}", {"alt": "media", "supportsAllDrives": "true"}
+        expected_size = int(item["size"]) if item.get("size") else None
+        partial = destination + ".part"
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        for attempt in range(self.max_retries + 1):
+            # Exports are generated on the fly and cannot be resumed
+            offset = os.path.getsize(partial) if os.path.exists(partial) and not export else 0
+            try:
+                if not (expected_size is not None and offset == expected_size):
+                    headers = await self._auth_headers()
+                    if offset:
+                        headers["Range"] = f"bytes={offset}-"
+                    async with self._http.stream("GET", url, params=params, headers=headers) as response:
+                        if response.status_code == 416 or (response.status_code in RETRY_STATUSES and attempt < self.max_retries):
+                            if response.status_code == 416:
+                                os.remove(partial)
+                            await self._backoff(attempt, response)
+                            continue
+                        response.raise_for_status()
+                        # A server that ignores Range sends the whole file again
+                        with open(partial, "ab" if response.status_code == 206 else "wb") as f:
+                            async for block in response.aiter_bytes():
+                                f.write(block)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                await self._backoff(attempt)
+                continue
+
+            if item.get("md5Checksum") and not export:
+                digest = await asyncio.get_running_loop().run_in_executor(None, _md5_file, partial)
+                if digest != item["md5Checksum"]:
+                    # Most likely a stale partial download of an older revision
+                    os.remove(partial)
+                    if attempt >= self.max_retries:
+                        raise ValueError(f"Checksum mismatch downloading {item.get('name')}")
+                    continue
+            os.replace(partial, destination)
+            return destination
+        raise RuntimeError(f"Giving up downloading {item.get('name')} after {self.max_retries + 1} attempts")
+
+
+def _md5_file(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _folder_cache_dir(folder_id: str) -> str:
+    return os.path.join(config.GOOGLE_DRIVE_CACHE_DIR, folder_id)
+
+
+def _local_path(folder_id: str, item: dict) -> str:
+    """Where the local copy of a Drive file lives; one directory per file id keeps equal names apart"""
+    name = _UNSAFE_NAME_RE.sub("_", item.get("name") or item["id"]).strip() or item["id"]
+    export = EXPORT_FORMATS.get(item.get("mimeType"))
+    if export and not name.lower().endswith(export[1]):
+        name += export[1]
+    return os.path.join(_folder_cache_dir(folder_id), "files", item["id"], name)
+
+
+def _is_wanted(item: dict, rules: ScanRules) -> bool:
+    """Apply the same extension, include/exclude and size rules as a local folder scan"""
+    if item.get("mimeType") == FOLDER_MIME_TYPE or item.get("trashed"):
+        return False
+    name = item.get("name") or ""
+    export = EXPORT_FORMATS.get(item.get("mimeType"))
+    extension = export[1] if export else os.path.splitext(name)[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        return False
+    if rules.matches(rules.exclude, name, name) or (rules.include and not rules.matches(rules.include, name, name)):
+        return False
+    if rules.max_file_size and item.get("size") and int(item["size"]) > rules.max_file_size:
+        return False
+    return True
+
+
+def load_sync_state(folder_id: str):
+    try:
+        with open(os.path.join(_folder_cache_dir(folder_id), "sync_state.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"⚠️ Ignoring unreadable Google Drive sync state for {folder_id}: {e}")
+        return None
+
+
+def save_sync_state(folder_id: str, state: dict):
+    path = os.path.join(_folder_cache_dir(folder_id), "sync_state.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _state_entry(item: dict, local_path: str) -> dict:
+    return {
+        "name": item.get("name"),
+        "mimeType": item.get("mimeType"),
+        "parents": item.get("parents", []),
+        "md5Checksum": item.get("md5Checksum"),
+        "modifiedTime": item.get("modifiedTime"),
+        "local_path": local_path,
+    }
+
+
+async def _fetch_and_ingest(client: DriveClient, folder_id: str, writer: GenerationWriter, downloads: list, local: list = ()):
+    """
+    Download files with a bounded number of concurrent transfers and stream each one into the writer as soon
+    as it lands, so extraction and embedding of early files overlap the remaining downloads. Files in local
+    are already on disk and are only re-extracted. Returns ({file_id: (item, path, chunk_count)}, {file_id: item}).
+    """
+    download_slots = asyncio.Semaphore(max(1, config.GOOGLE_DRIVE_MAX_CONNECTIONS))
+    extract_slots = asyncio.Semaphore(max(1, config.INGEST_WORKERS))
+    results, failed = {}, {}
+
+    async def handle(item: dict, fetch: bool):
+        path = _local_path(folder_id, item)
+        try:
+            if fetch or not os.path.exists(path):
+                async with download_slots:
+                    print(f"  ⬇️ Downloading: {item.get('name')}")
+                    await client.download(item, path)
+        except Exception as e:
+            print(f"  ❌ Failed to download {item.get('name')}: {e}")
+            failed[item["id"]] = item
+            return
+        async with extract_slots:
+            # Drive names are not unique, file ids are
+            count = await ingest_file(path, writer, id_prefix=f"gdrive_{item['id']}", metadata={"drive_file_id": item["id"]})
+        results[item["id"]] = (item, path, count)
+
+    tasks = [asyncio.ensure_future(handle(item, True)) for item in downloads]
+    tasks += [asyncio.ensure_future(handle(item, False)) for item in local]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # An embedding failure in one file stops the others from writing into a generation about to be discarded
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results, failed
+
+
+def _iter_pages(collection, include: list, where: dict = None, batch_size: int = READ_PAGE_SIZE):
+    offset = 0
+    while True:
+        page = collection.get(where=where, include=include, limit=batch_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def _expand_dirty_sources(collection, dirty_sources: set) -> set:
+    """
+    A dropped canonical chunk may also stand in for duplicates in clean files; those files become dirty
+    as well so their content is re-extracted. Only the metadata of chunks from dirty files is read.
+    """
+    dirty_sources = set(dirty_sources)
+    frontier = set(dirty_sources)
+    while frontier:
+        orphaned = set()
+        for page in _iter_pages(collection, ["metadatas"], where={"source": {"$in": sorted(frontier)}}):
+            for meta in page["metadatas"]:
+                orphaned.update(set(json.loads(meta.get("sources") or "[]")) - dirty_sources)
+        dirty_sources |= orphaned
+        frontier = orphaned
+    return dirty_sources
+
+
+def _survivors(page: dict, dirty_sources: set):
+    """The chunks of one page of the live collection that do not come from dirty files, as writer columns"""
+    chunks, ids, metas, embeddings = [], [], [], []
+    for chunk_id, document, meta, embedding in zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"]):
+        if meta.get("source") in dirty_sources:
+            continue
+        sources = json.loads(meta.get("sources") or "[]")
+        if any(source in dirty_sources for source in sources):
+            meta = dict(meta)
+            kept = [source for source in sources if source not in dirty_sources]
+            meta["sources"] = json.dumps(kept)
+            meta["duplicate_count"] = max(0, meta.get("duplicate_count", 0) - (len(sources) - len(kept)))
+        chunks.append(document)
+        ids.append(chunk_id)
+        metas.append(meta)
+        embeddings.append(embedding)
+    return chunks, ids, metas, embeddings
+
+
+async def _copy_survivors(collection, dirty_sources: set, writer: GenerationWriter):
+    """Copy the live chunks of clean files into the writer page by page, with their stored embeddings"""
+    loop = asyncio.get_running_loop()
+    pages = _iter_pages(collection, ["documents", "metadatas", "embeddings"])
+    while (page := await loop.run_in_executor(None, next, pages, None)) is not None:
+        chunks, ids, metas, embeddings = _survivors(page, dirty_sources)
+        if ids:
+            await writer.add_embedded(chunks, ids, metas, embeddings)
+
+
+async def _build_staging(client: DriveClient, folder_id: str, downloads: list, local: list = (),
+                         live_collection=None, dirty_sources: set = frozenset()):
+    """
+    Write a staging generation: the surviving live chunks keep their stored embeddings, then downloaded
+    files stream through extraction, de-duplication against the survivors and batched embedding, so
+    memory follows INGEST_EMBED_BATCH_SIZE rather than the size of the folder. The staging generation is
+    discarded on errors. Returns (staging, writer, results, failed).
+    """
+    staging = create_staging_generation()
+    writer = GenerationWriter(staging.collection, config.INGEST_EMBED_BATCH_SIZE)
+    try:
+        if live_collection is not None:
+            await _copy_survivors(live_collection, dirty_sources, writer)
+            print(f"♻️ Reused {writer.chunks_reused} unchanged chunks with their stored embeddings")
+        results, failed = await _fetch_and_ingest(client, folder_id, writer, downloads, local)
+        await writer.finish()
+        expected = writer.chunks_reused + writer.chunks_added
+        final_count = staging.collection.count()
+        if final_count != expected:
+            raise ValueError(f"expected {expected} documents in staging collection, found {final_count}")
+    except Exception:
+        discard_generation(staging)
+        raise
+    return staging, writer, results, failed
+
+
+async def _write_facts(staging, paths: list, copy_from: str = None, exclude_sources=()) -> int:
+    """Fill the staging fact table from the processed files, carrying over the facts of unchanged files"""
+    if not config.FACTS_ENABLED:
+        return 0
+
+    def write():
+        facts = FactWriter(staging.path)
+        try:
+            if copy_from:
+                facts.copy_from(copy_from, exclude_sources)
+            for path in paths:
+                facts.add_file(path)
+            return facts.facts_added
+        finally:
+            facts.close()
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, write)
+    except Exception:
+        discard_generation(staging)
+        raise
+
+
+async def _full_sync(client: DriveClient, folder_id: str, rules: ScanRules):
+    # Taken before listing so nothing that changes during the listing is missed by the next delta sync
+    page_token = await client.get_start_page_token()
+    files, folders = await client.list_tree(folder_id)
+    wanted = [item for item in files.values() if _is_wanted(item, rules)]
+    print(f"📁 Google Drive folder {folder_id}: {len(wanted)} of {len(files)} files to index")
+    if not wanted:
+        return {"files_processed": 0, "chunks_added": 0, "error": "No files found in Google Drive folder"}
+
+    staging, writer, results, failed = await _build_staging(client, folder_id, wanted)
+    if writer.chunks_added == 0:
+        discard_generation(staging)
+        return {"files_processed": len(results), "chunks_added": 0, "error": "No content could be extracted from files"}
+
+    facts_extracted = await _write_facts(staging, [path for _, path, _ in results.values()])
+    activate_generation(staging)
+    print(f"🔀 Index generation {staging.path} is now live")
+
+    save_sync_state(folder_id, {
+        "folder_id": folder_id,
+        "page_token": page_token,
+        "generation_path": staging.path,
+        "folders": folders,
+        "files": {file_id: _state_entry(item, path) for file_id, (item, path, _) in results.items()},
+        "pending": failed,
+    })
+    return {
+        "sync_mode": "full",
+        "files_processed": len(results),
+        "files_failed": len(failed),
+        "files_removed": 0,
+        "chunks_added": writer.chunks_added,
+        "duplicates_removed": writer.duplicates_removed,
+        "facts_extracted": facts_extracted,
+        "final_document_count": writer.chunks_reused + writer.chunks_added,
+    }
+
+
+async def _delta_sync(client: DriveClient, folder_id: str, state: dict, rules: ScanRules, live):
+    changes, page_token = await client.list_changes(state["page_token"])
+    folders = dict(state["folders"])
+    known = state["files"]
+    # Files that failed last time are retried
+    upserts = dict(state.get("pending", {}))
+    removals = set()
+
+    # Folders first, repeated until stable, so a folder created inside a new folder is picked up too
+    new_folders = []
+    changed = True
+    while changed:
+        changed = False
+        for change in changes:
+            item = change.get("file") or {}
+            file_id = change["fileId"]
+            if file_id == folder_id or (item.get("mimeType") != FOLDER_MIME_TYPE and file_id not in folders):
+                continue
+            in_scope = not change.get("removed") and not item.get("trashed") and any(
+                parent in folders for parent in item.get("parents", [])
+            )
+            if in_scope and file_id not in folders:
+                folders[file_id] = item["parents"][0]
+                new_folders.append(file_id)
+                changed = True
+            elif not in_scope and file_id in folders:
+                del folders[file_id]
+                changed = True
+
+    # Drop folders whose parent chain no longer reaches the synced folder
+    changed = True
+    while changed:
+        orphaned = [child for child, parent in folders.items() if parent is not None and parent not in folders]
+        changed = bool(orphaned)
+        for child in orphaned:
+            del folders[child]
+
+    # A folder moved in brings existing files that do not show up as changes themselves
+    for new_folder in new_folders:
+        if new_folder in folders:
+            files, subfolders = await client.list_tree(new_folder)
+            subfolders.pop(new_folder)
+            folders.update(subfolders)
+            upserts.update({item["id"]: item for item in files.values() if _is_wanted(item, rules)})
+
+    for change in changes:
+        item = change.get("file") or {}
+        file_id = change["fileId"]
+        if file_id in folders or item.get("mimeType") == FOLDER_MIME_TYPE:
+            continue
+        in_scope = not change.get("removed") and any(parent in folders for parent in item.get("parents", []))
+        if not in_scope or not _is_wanted(item, rules):
+            upserts.pop(file_id, None)
+            if file_id in known:
+                removals.add(file_id)
+            continue
+        previous = known.get(file_id)
+        # Renames, moves within the folder and sharing changes do not touch the content
+        if previous and previous["md5Checksum"] == item.get("md5Checksum") and previous["modifiedTime"] == item.get("modifiedTime"):
+            continue
+        upserts[file_id] = item
+
+    for file_id, entry in known.items():
+        if not any(parent in folders for parent in entry["parents"]):
+            upserts.pop(file_id, None)
+            removals.add(file_id)
+
+    if not upserts and not removals:
+        state.update({"page_token": page_token, "folders": folders})
+        save_sync_state(folder_id, state)
+        print(f"✅ Google Drive folder {folder_id} is up to date")
+        return {
+            "sync_mode": "delta",
+            "files_processed": 0,
+            "files_failed": 0,
+            "files_removed": 0,
+            "chunks_added": 0,
+            "duplicates_removed": 0,
+            "final_document_count": live.collection.count(),
+        }
+
+    print(f"🔄 Google Drive delta: {len(upserts)} new or changed files, {len(removals)} removed")
+    dirty_sources = {known[file_id]["local_path"] for file_id in set(upserts) | removals if file_id in known}
+    dirty_sources = await asyncio.get_running_loop().run_in_executor(
+        None, _expand_dirty_sources, live.collection, dirty_sources
+    )
+
+    # Unchanged files that lost chunks with a dropped canonical copy are re-extracted from their local copy
+    by_path = {entry["local_path"]: file_id for file_id, entry in known.items()}
+    reextract = [
+        {"id": by_path[path], **known[by_path[path]]}
+        for path in dirty_sources
+        if path in by_path and by_path[path] not in upserts and by_path[path] not in removals
+    ]
+
+    staging, writer, results, failed = await _build_staging(
+        client, folder_id, list(upserts.values()), reextract, live_collection=live.collection, dirty_sources=dirty_sources
+    )
+    facts_extracted = await _write_facts(
+        staging, [path for _, path, _ in results.values()], copy_from=live.path, exclude_sources=dirty_sources
+    )
+    activate_generation(staging)
+    print(f"🔀 Index generation {staging.path} is now live")
+
+    for file_id in removals:
+        known.pop(file_id, None)
+        shutil.rmtree(os.path.join(_folder_cache_dir(folder_id), "files", file_id), ignore_errors=True)
+    for file_id, (item, path, _) in results.items():
+        previous = known.get(file_id)
+        if previous and previous["local_path"] != path and os.path.exists(previous["local_path"]):
+            os.remove(previous["local_path"])
+        known[file_id] = _state_entry(item, path)
+    state.update({
+        "page_token": page_token,
+        "generation_path": staging.path,
+        "folders": folders,
+        "files": known,
+        "pending": failed,
+    })
+    save_sync_state(folder_id, state)
+    return {
+        "sync_mode": "delta",
+        "files_processed": len(results),
+        "files_failed": len(failed),
+        "files_removed": len(removals),
+        "chunks_added": writer.chunks_added,
+        "duplicates_removed": writer.duplicates_removed,
+        "facts_extracted": facts_extracted,
+        "final_document_count": writer.chunks_reused + writer.chunks_added,
+    }
+
+
+async def sync_drive_folder(folder: str):
+    """
+    Index a Google Drive folder. The first sync (or one after the index was rebuilt from another source)
+    downloads everything; later syncs follow the Drive changes feed and only re-fetch and re-embed files
+    whose content changed, reusing the stored embeddings of everything else.
+    """
+    folder_id = parse_folder_id(folder)
+    rules = ScanRules.from_config()
+    async with index_write_lock():
+        async with DriveClient() as client:
+            state = load_sync_state(folder_id)
+            live = get_live_generation()
+            # A compacted copy of the generation the last sync wrote still holds exactly its content
+            if state and state.get("page_token") and state.get("generation_path") == generation_content_id(live.path):
+                return await _delta_sync(client, folder_id, state, rules, live)
+            print(f"📥 Full sync of Google Drive folder {folder_id}")
+            return await _full_sync(client, folder_id, rules)
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import shutil
+import zipfile
+import tempfile
+import numpy as np
+from utils import config
+from .embedding_service import DOCUMENT_INSTRUCTION, embedding_dimension
+from .fact_store import FACTS_FILE
+from .index_store import (
+    index_write_lock, reading_generation, create_staging_generation, discard_generation, activate_generation
+)
+
+SNAPSHOT_FORMAT = "myaccobot-index-snapshot"
+SNAPSHOT_VERSION = 1
+
+# Archive members: records are one JSON object per line, embeddings are raw little-endian float32 rows,
+# facts is the generation's fact table as it is (snapshots made before it was included have none)
+MANIFEST_MEMBER = "manifest.json"
+RECORDS_MEMBER = "records.jsonl"
+EMBEDDINGS_MEMBER = "embeddings.f32"
+FACTS_MEMBER = "facts.sqlite3"
+
+BATCH_SIZE = 1000
+
+
+class SnapshotError(ValueError):
+    """The snapshot cannot be loaded into this installation"""
+
+
+def resolve_snapshot_path(name: str) -> str:
+    """Path of a snapshot named by an API client; it must stay inside SNAPSHOT_DIR"""
+    root = os.path.realpath(config.SNAPSHOT_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise SnapshotError(f"Snapshots must be inside {config.SNAPSHOT_DIR}")
+    return path
+
+
+def _is_snapshot(path: str) -> bool:
+    try:
+        read_manifest(path)
+        return True
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return False
+
+
+def _file_manifest(source_chunks: dict, referenced: set) -> list:
+    files = []
+    for source in sorted(referenced | set(source_chunks)):
+        entry = {"source": source, "chunks": source_chunks.get(source, 0)}
+        try:
+            info = os.stat(source)
+            entry.update(size=info.st_size, modified=info.st_mtime)
+        except OSError:
+            pass
+        files.append(entry)
+    return files
+
+
+def _fact_count(path: str) -> int:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def write_snapshot(path: str) -> dict:
+    """
+    Export the live generation (collection and fact table) to a compressed snapshot at path. Records and
+    embeddings are streamed in batches, so memory use does not grow with the collection. Returns the manifest.
+    """
+    started = time.perf_counter()
+    if os.path.lexists(path) and not (os.path.isfile(path) and _is_snapshot(path)):
+        raise SnapshotError(f"{path} exists and is not an index snapshot, refusing to replace it")
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    source_chunks, referenced = {}, set()
+    count, dimension = 0, None
+
+    try:
+        with reading_generation() as generation, zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive, \
+                tempfile.TemporaryFile() as vectors:
+            collection = generation.collection
+            # A zip member is written one at a time, so embeddings are spooled and copied in after the records
+            with archive.open(RECORDS_MEMBER, "w", force_zip64=True) as records:
+                offset = 0
+                while True:
+                    page = collection.get(include=["documents", "metadatas", "embeddings"], limit=BATCH_SIZE, offset=offset)
+                    if not page["ids"]:
+                        break
+                    embeddings = np.asarray(page["embeddings"], dtype="<f4")
+                    dimension = dimension or embeddings.shape[1]
+                    if embeddings.shape[1] != dimension:
+                        raise SnapshotError(f"Collection mixes embedding dimensions {dimension} and {embeddings.shape[1]}")
+                    for chunk_id, document, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                        records.write(json.dumps({"id": chunk_id, "document": document, "metadata": meta}).encode("utf-8") + b"\n")
+                        source_chunks[meta.get("source")] = source_chunks.get(meta.get("source"), 0) + 1
+                        referenced.update(json.loads(meta.get("sources") or "[]"))
+                    vectors.write(embeddings.tobytes())
+                    count += len(page["ids"])
+                    offset += len(page["ids"])
+
+            vectors.seek(0)
+            with archive.open(EMBEDDINGS_MEMBER, "w", force_zip64=True) as member:
+                shutil.copyfileobj(vectors, member, 1024 * 1024)
+
+            # A live generation's fact table is no longer written to, so the file is copied as it is
+            facts_path = os.path.join(generation.path, FACTS_FILE)
+            facts = None
+            if os.path.exists(facts_path):
+                facts = _fact_count(facts_path)
+                archive.write(facts_path, FACTS_MEMBER)
+
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "created_at": time.time(),
+                "model_name": config.EMBEDDING_MODEL_NAME,
+                "instruction": DOCUMENT_INSTRUCTION,
+                "dimension": dimension,
+                "count": count,
+                "distance": "cosine",
+                # The keyword index (per-chunk sentence offsets) travels inside each record's metadata
+                "keyword_index": "metadata.sentence_offsets",
+                "facts": facts,
+                "files": _file_manifest(source_chunks, referenced),
+            }
+            archive.writestr(MANIFEST_MEMBER, json.dumps(manifest, indent=2))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, path)
+    print(f"📦 Exported {count} chunks to {path} in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+def read_manifest(path: str) -> dict:
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read(MANIFEST_MEMBER))
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"{path} is not an index snapshot")
+    if manifest.get("version", 0) > SNAPSHOT_VERSION:
+        raise SnapshotError(f"Snapshot version {manifest['version']} is newer than this server supports ({SNAPSHOT_VERSION})")
+    return manifest
+
+
+def validate_manifest(manifest: dict):
+    """Embeddings are only usable with the model, instruction and vector width they were made with"""
+    if manifest["model_name"] != config.EMBEDDING_MODEL_NAME:
+        raise SnapshotError(f"Snapshot was embedded with {manifest['model_name']}, this server uses {config.EMBEDDING_MODEL_NAME}")
+    if manifest.get("instruction") != DOCUMENT_INSTRUCTION:
+        raise SnapshotError(f"Snapshot was embedded with instruction {manifest.get('instruction')!r}, this server uses {DOCUMENT_INSTRUCTION!r}")
+    if manifest["count"] and manifest["dimension"] != embedding_dimension():
+        raise SnapshotError(f"Snapshot embeddings have {manifest['dimension']} dimensions, the model produces {embedding_dimension()}")
+
+
+def load_snapshot(path: str, collection, generation_path: str = None) -> dict:
+    """
+    Bulk insert a snapshot into an empty collection and, when generation_path is given, restore its fact
+    table there; returns the manifest
+    """
+    started = time.perf_counter()
+    manifest = read_manifest(path)
+    validate_manifest(manifest)
+    row_bytes = (manifest["dimension"] or 0) * 4
+
+    with zipfile.ZipFile(path) as archive, archive.open(RECORDS_MEMBER) as records, archive.open(EMBEDDINGS_MEMBER) as vectors:
+        loaded = 0
+        batch = []
+        for line in records:
+            batch.append(json.loads(line))
+            if len(batch) == BATCH_SIZE:
+                loaded += _insert_batch(collection, batch, vectors, manifest["dimension"], row_bytes)
+                batch = []
+        if batch:
+            loaded += _insert_batch(collection, batch, vectors, manifest["dimension"], row_bytes)
+
+    if loaded != manifest["count"] or collection.count() != manifest["count"]:
+        raise SnapshotError(f"Snapshot declares {manifest['count']} chunks, loaded {loaded}")
+    if generation_path and manifest.get("facts") is not None:
+        _restore_facts(path, os.path.join(generation_path, FACTS_FILE), manifest["facts"])
+    print(f"📦 Imported {loaded} chunks from {path} in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+def _restore_facts(path: str, facts_path: str, expected: int):
+    with zipfile.ZipFile(path) as archive, archive.open(FACTS_MEMBER) as member, open(facts_path, "wb") as target:
+        shutil.copyfileobj(member, target, 1024 * 1024)
+    try:
+        restored = _fact_count(facts_path)
+    except sqlite3.Error as e:
+        raise SnapshotError(f"Snapshot fact table cannot be read: {e}")
+    if restored != expected:
+        raise SnapshotError(f"Snapshot declares {expected} facts, restored {restored}")
+
+
+def _insert_batch(collection, batch: list, vectors, dimension: int, row_bytes: int) -> int:
+    data = vectors.read(row_bytes * len(batch))
+    if len(data) != row_bytes * len(batch):
+        raise SnapshotError("Snapshot embeddings are truncated")
+    embeddings = np.frombuffer(data, dtype="<f4").reshape(len(batch), dimension)
+    collection.add(
+        ids=[record["id"] for record in batch],
+        documents=[record["document"] for record in batch],
+        metadatas=[record["metadata"] for record in batch],
+        embeddings=embeddings,
+    )
+    return len(batch)
+
+
+async def export_snapshot(path: str) -> dict:
+    return await asyncio.get_running_loop().run_in_executor(None, write_snapshot, path)
+
+
+async def import_snapshot(path: str) -> dict:
+    """Load a snapshot into a staging generation and make it live; the current index serves queries meanwhile"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} does not exist")
+    loop = asyncio.get_running_loop()
+    async with index_write_lock():
+        staging = create_staging_generation()
+        try:
+            manifest = await loop.run_in_executor(None, load_snapshot, path, staging.collection, staging.path)
+        except Exception:
+            discard_generation(staging)
+            raise
+        activate_generation(staging)
+        print(f"🔀 Index generation {staging.path} is now live")
+    return manifest
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("export", "import", "inspect"):
+        print("Usage: python -m database.index_snapshot [export | import | inspect] <snapshot file>")
+        sys.exit(2)
+    command, snapshot_path = sys.argv[1], sys.argv[2]
+    if command == "export":
+        write_snapshot(snapshot_path)
+    elif command == "import":
+        asyncio.run(import_snapshot(snapshot_path))
+    else:
+        details = read_manifest(snapshot_path)
+        details["files"] = len(details["files"])
+        print(json.dumps(details, indent=2))
@@ -0,0 +1,451 @@
+import os
+import re
+import json
+import time
+import shutil
+import sqlite3
+import asyncio
+import threading
+import chromadb
+from chromadb.api.shared_system_client import SharedSystemClient
+from contextlib import asynccontextmanager, contextmanager
+from filelock import FileLock
+from utils import config
+
+_process_write_lock = None
+
+_live_generation = None
+_live_signature = None
+_live_lock = threading.RLock()
+
+# Directories created by create_staging_generation
+GENERATION_DIR_PATTERN = re.compile(r"^chroma_db_\d+$")
+
+# Chroma keeps documents, metadata and its write-ahead queue here; the HNSW files sit in one directory per segment
+SQLITE_FILE = "chroma.sqlite3"
+
+
+def read_current_index_path():
+    """Path of the live index generation as published by the writer, or None if nothing was published yet"""
+    try:
+        with open(config.INDEX_POINTER_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)["path"]
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError) as e:
+        print(f"⚠️ Ignoring unreadable index pointer {config.INDEX_POINTER_PATH}: {e}")
+        return None
+
+
+def index_pointer_signature():
+    """Cheap change marker for the pointer file; workers compare it before each query"""
+    try:
+        return os.stat(config.INDEX_POINTER_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _write_json_atomically(path: str, data: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def publish_index_path(path: str):
+    """Atomically point every worker at a new index generation"""
+    _write_json_atomically(config.INDEX_POINTER_PATH, {"path": path, "published_at": time.time()})
+
+
+def read_generation_manifest() -> list:
+    """
+    Every generation kept on disk, oldest first: {"path", "state" ("staging", "live" or "retained"), "content_id",
+    "created_at", "activated_at", "retired_at", "compacted_at"}. content_id is the path of the build the
+    content came from, so a compacted copy keeps the id of its source. "staging" marks a build in progress.
+    Only holders of the index write lock change it.
+    """
+    try:
+        with open(config.INDEX_MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)["generations"]
+    except FileNotFoundError:
+        return []
+    except (ValueError, KeyError) as e:
+        print(f"⚠️ Ignoring unreadable index manifest {config.INDEX_MANIFEST_PATH}: {e}")
+        return []
+
+
+def write_generation_manifest(generations: list):
+    _write_json_atomically(config.INDEX_MANIFEST_PATH, {"generations": generations, "updated_at": time.time()})
+
+
+def _manifest_entry(path: str, state: str) -> dict:
+    try:
+        created_at = os.stat(path).st_mtime
+    except OSError:
+        created_at = time.time()
+    return {"path": path, "state": state, "content_id": path, "created_at": created_at,
+            "activated_at": None, "retired_at": None, "compacted_at": None}
+
+
+def _apply_retention(generations: list) -> list:
+    """Drop retained generations beyond INDEX_RETAIN_GENERATIONS (newest kept) and return their paths"""
+    retained = sorted(
+        (entry for entry in generations if entry["state"] == "retained"),
+        key=lambda entry: entry["retired_at"] or 0, reverse=True,
+    )
+    expired = [entry["path"] for entry in retained[max(0, config.INDEX_RETAIN_GENERATIONS):]]
+    generations[:] = [entry for entry in generations if entry["path"] not in expired]
+    return expired
+
+
+def record_activation(path: str, previous_path: str = None, replace_previous: bool = False) -> list:
+    """
+    Mark path live and the previous generation retained, or forget it with replace_previous; returns the
+    paths whose files can go: those retention has expired plus a replaced previous generation
+    """
+    now = time.time()
+    generations = read_generation_manifest()
+    if previous_path and previous_path != path and os.path.isdir(previous_path) \
+            and not any(entry["path"] == previous_path for entry in generations):
+        # Generations from before the manifest existed are adopted so retention covers them too
+        generations.append(_manifest_entry(previous_path, "live"))
+
+    replaced = [entry["path"] for entry in generations if entry["state"] == "live" and entry["path"] != path] \
+        if replace_previous else []
+    generations[:] = [entry for entry in generations if entry["path"] not in replaced]
+    for entry in generations:
+        if entry["state"] == "live" and entry["path"] != path:
+            entry["state"] = "retained"
+            entry["retired_at"] = now
+    entry = next((entry for entry in generations if entry["path"] == path), None)
+    if entry is None:
+        entry = _manifest_entry(path, "live")
+        generations.append(entry)
+    entry.update(state="live", activated_at=now, retired_at=None)
+
+    expired = _apply_retention(generations)
+    write_generation_manifest(generations)
+    return replaced + expired
+
+
+def _forget_generation(path: str):
+    write_generation_manifest([entry for entry in read_generation_manifest() if entry["path"] != path])
+
+
+def update_generation_entry(path: str, **fields):
+    generations = read_generation_manifest()
+    for entry in generations:
+        if entry["path"] == path:
+            entry.update(fields)
+    write_generation_manifest(generations)
+
+
+def generation_content_id(path: str) -> str:
+    """Identity of a generation's content, unchanged by compaction"""
+    for entry in read_generation_manifest():
+        if entry["path"] == path:
+            return entry.get("content_id", path)
+    return path
+
+
+def schedule_generation_removal(path: str):
+    """Delete a generation's files after the grace period, so other workers can finish queries on it"""
+    timer = threading.Timer(config.INDEX_RETIRE_GRACE_SECONDS, _remove_generation_files, args=(path,))
+    timer.daemon = True
+    timer.start()
+
+
+def _remove_generation_files(path: str):
+    shutil.rmtree(path, ignore_errors=True)
+    print(f"🧹 Removed retired index generation: {path}")
+
+
+@asynccontextmanager
+async def index_write_lock():
+    """
+    Serialize index writes. The asyncio lock orders writers inside one worker; the file lock
+    makes sure only one worker process writes to the index at a time.
+    """
+    global _process_write_lock
+    if _process_write_lock is None:
+        _process_write_lock = asyncio.Lock()
+
+    async with _process_write_lock:
+        os.makedirs(os.path.dirname(config.INDEX_WRITE_LOCK_PATH) or ".", exist_ok=True)
+        lock = FileLock(config.INDEX_WRITE_LOCK_PATH, thread_local=False)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lock.acquire)
+        try:
+            yield
+        finally:
+            lock.release()
+
+
+class IndexGeneration:
+    """One on-disk index directory with its open collection and a count of queries reading from it"""
+
+    def __init__(self, path: str, create: bool = True):
+        self.path = path
+        if create or os.path.isdir(path):
+            self.client = chromadb.PersistentClient(path=path)
+        else:
+            # Nothing has been indexed yet: serve an empty in-memory collection rather than create the directory
+            self.client = chromadb.EphemeralClient()
+        self.collection = self.client.get_or_create_collection(
+            name="documents",
+            metadata={"hnsw:space": "cosine"}
+        )
+        self._readers = 0
+        self._retired = False
+        self._delete_files = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._readers += 1
+
+    def release(self):
+        with self._lock:
+            self._readers -= 1
+            drained = self._retired and self._readers == 0
+        if drained:
+            self._schedule_cleanup()
+
+    def retire(self, delete_files: bool):
+        """Stop handing this generation out; its files go once the queries still reading it have drained"""
+        with self._lock:
+            self._retired = True
+            self._delete_files = delete_files
+            drained = self._readers == 0
+        if drained:
+            self._schedule_cleanup()
+
+    def _schedule_cleanup(self):
+        self.close()
+        if self._delete_files:
+            schedule_generation_removal(self.path)
+
+    def close(self):
+        """
+        Stop the Chroma system behind this generation and drop it from chromadb's per-path cache, so its
+        SQLite and HNSW files are closed and deleting the directory actually frees the space
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            close()
+            return
+        # Clients before chromadb 1.1 cannot be closed; their shared system is stopped directly
+        system = SharedSystemClient._identifier_to_system.pop(self.client._identifier, None)
+        getattr(SharedSystemClient, "_identifier_to_refcount", {}).pop(self.client._identifier, None)
+        if system is not None:
+            system.stop()
+
+
+def _document_count(path: str):
+    """Documents stored in a generation, read from its SQLite file without opening a client; None if unreadable"""
+    db_path = os.path.join(path, SQLITE_FILE)
+    if not os.path.exists(db_path):
+        return 0
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+
+def _unmanaged_generation_paths(generations: list) -> list:
+    """chroma_db_<ts> directories the manifest does not know, newest first"""
+    known = {os.path.abspath(entry["path"]) for entry in generations}
+    try:
+        names = os.listdir(config.INDEX_DATA_DIR)
+    except FileNotFoundError:
+        return []
+    paths = [
+        os.path.join(config.INDEX_DATA_DIR, name) for name in names
+        if GENERATION_DIR_PATTERN.match(name) and os.path.isdir(os.path.join(config.INDEX_DATA_DIR, name))
+    ]
+    return sorted(
+        (path for path in paths if os.path.abspath(path) not in known),
+        key=lambda path: int(os.path.basename(path).rsplit("_", 1)[1]), reverse=True,
+    )
+
+
+def _startup_index_path():
+    """
+    The published generation, or the newest one in the manifest that is still on disk when the pointer
+    is missing or names a directory that no longer exists. Installs from before the manifest existed
+    have neither; their newest chroma_db_<ts> directory is the index they were serving.
+    """
+    path = read_current_index_path()
+    if path and os.path.isdir(path):
+        return path
+    generations = read_generation_manifest()
+    activated = [entry for entry in generations if entry["state"] != "staging"]
+    for entry in sorted(activated, key=lambda entry: entry["activated_at"] or 0, reverse=True):
+        if os.path.isdir(entry["path"]):
+            if path:
+                print(f"⚠️ Published index generation {path} is missing, falling back to {entry['path']}")
+            return entry["path"]
+    unmanaged = _unmanaged_generation_paths(generations)
+    if unmanaged:
+        print(f"⚠️ No published index generation, using the newest one on disk: {unmanaged[0]}")
+        return unmanaged[0]
+    return path
+
+
+def get_live_generation() -> IndexGeneration:
+    """The generation queries read from, reopened when another worker has published a new one"""
+    global _live_generation, _live_signature
+    with _live_lock:
+        signature = index_pointer_signature()
+        if _live_generation is None or signature != _live_signature:
+            path = _startup_index_path() if _live_generation is None else read_current_index_path()
+            path = path or os.path.join(config.INDEX_DATA_DIR, "chroma_db")
+            if _live_generation is None or path != _live_generation.path:
+                previous = _live_generation
+                _live_generation = IndexGeneration(path, create=False)
+                if previous is not None:
+                    print(f"🔄 Switched to index generation: {path}")
+                    # The writer owns the files; this worker only closes its handle once readers drain
+                    previous.retire(delete_files=False)
+            _live_signature = signature
+        return _live_generation
+
+
+@contextmanager
+def reading_generation():
+    """Read from the live generation; a swap during the read defers cleanup until it finishes"""
+    with _live_lock:
+        generation = get_live_generation()
+        generation.acquire()
+    try:
+        yield generation
+    finally:
+        generation.release()
+
+
+@contextmanager
+def reading_collection():
+    with reading_generation() as generation:
+        yield generation.collection
+
+
+def new_generation_path() -> str:
+    return os.path.join(config.INDEX_DATA_DIR, f"chroma_db_{int(time.time() * 1000)}")
+
+
+def reserve_generation_path() -> str:
+    """
+    Name a new generation directory and record it in the manifest as a build in progress, so the startup
+    sweep can tell an interrupted build from index data it does not know. Callers must hold the index write lock.
+    """
+    path = new_generation_path()
+    generations = read_generation_manifest()
+    generations.append(_manifest_entry(path, "staging"))
+    write_generation_manifest(generations)
+    return path
+
+
+def create_staging_generation() -> IndexGeneration:
+    """Open an empty generation next to the live one for a rebuild"""
+    path = reserve_generation_path()
+    os.makedirs(path, mode=0o755, exist_ok=True)
+    return IndexGeneration(path)
+
+
+def discard_generation(generation: IndexGeneration):
+    """Throw away a staging generation that never went live"""
+    generation.close()
+    discard_generation_path(generation.path)
+
+
+def discard_generation_path(path: str):
+    shutil.rmtree(path, ignore_errors=True)
+    _forget_generation(path)
+    print(f"🗑️ Discarded staging index generation: {path}")
+
+
+def activate_generation(generation: IndexGeneration, replace_previous: bool = False):
+    """
+    Atomically make a verified staging generation live and retire the previous one. With replace_previous
+    the previous generation is deleted instead of retained, for a copy that holds the same content.
+    """
+    global _live_generation, _live_signature
+    with _live_lock:
+        previous = get_live_generation()
+        # An empty generation is no rollback target, so it is replaced rather than retained
+        replace_previous = replace_previous or (previous is not None and previous.collection.count() == 0)
+        publish_index_path(generation.path)
+        _live_generation = generation
+        _live_signature = index_pointer_signature()
+    expired = record_activation(generation.path, previous.path if previous is not None else None, replace_previous)
+    if previous is not None and previous.path != generation.path:
+        # Retained generations stay on disk; this worker only closes its handle once readers drain
+        previous.retire(delete_files=previous.path in expired)
+    for path in expired:
+        if previous is None or path != previous.path:
+            schedule_generation_removal(path)
+
+
+def reconcile_generations() -> dict:
+    """
+    Bring the manifest in line with the data directory at startup: adopt the live generation, forget
+    generations whose files are gone, delete staging builds that were recorded but never finished and
+    apply the retention limit. Directories the manifest does not know are left alone. Callers must hold
+    the index write lock.
+    """
+    live_path = _startup_index_path()
+    if live_path and os.path.isdir(live_path) and live_path != read_current_index_path():
+        # Republish the generation the startup fell back to, so every worker agrees on it
+        publish_index_path(live_path)
+    live_abspath = os.path.abspath(live_path) if live_path else None
+
+    generations, unfinished = [], []
+    for entry in read_generation_manifest():
+        if not os.path.isdir(entry["path"]):
+            continue
+        if os.path.abspath(entry["path"]) == live_abspath:
+            # Also covers a build that was published just before the process stopped
+            entry.update(state="live", activated_at=entry["activated_at"] or time.time(), retired_at=None)
+        elif entry["state"] == "staging":
+            # Nothing else builds while the write lock is held, so this build never finished
+            unfinished.append(entry["path"])
+            continue
+        elif entry["state"] == "live":
+            entry.update(state="retained", retired_at=entry["retired_at"] or time.time())
+        generations.append(entry)
+    known = {os.path.abspath(entry["path"]) for entry in generations}
+    if live_path and os.path.isdir(live_path) and live_abspath not in known:
+        generations.append(_manifest_entry(live_path, "live"))
+        known.add(live_abspath)
+
+    legacy_path = os.path.join(config.INDEX_DATA_DIR, "chroma_db")
+    if os.path.isdir(legacy_path) and os.path.abspath(legacy_path) not in known and _document_count(legacy_path) != 0:
+        # The fixed-path index from before generations existed counts as a replaced generation, unless it is empty
+        entry = _manifest_entry(legacy_path, "retained")
+        entry["retired_at"] = entry["created_at"]
+        generations.append(entry)
+
+    for path in unfinished:
+        shutil.rmtree(path, ignore_errors=True)
+        print(f"🧹 Removed unfinished staging generation: {path}")
+    unmanaged = [path for path in _unmanaged_generation_paths(generations) if path not in unfinished]
+    if unmanaged:
+        print(f"⚠️ Leaving index directories the manifest does not know in place: {', '.join(unmanaged)}")
+
+    expired = _apply_retention(generations)
+    write_generation_manifest(generations)
+    for path in expired:
+        _remove_generation_files(path)
+    return {"live": live_path, "unfinished_removed": unfinished, "unmanaged": unmanaged, "expired_removed": expired}
@@ -0,0 +1,104 @@
+import re
+import json
+from bisect import bisect_right
+from functools import lru_cache
+
+_SENTENCE_SPLIT_RE = re.compile(r'[.!?]+')
+
+
+def segment_sentences(text: str) -> list:
+    """
+    Return (start, end) offsets of the non-empty, whitespace-stripped sentences of text,
+    split the same way extract_relevant_sentences always has.
+    """
+    offsets = []
+    position = 0
+    for delimiter in _SENTENCE_SPLIT_RE.finditer(text):
+        _append_stripped(text, position, delimiter.start(), offsets)
+        position = delimiter.end()
+    _append_stripped(text, position, len(text), offsets)
+    return offsets
+
+
+def _append_stripped(text: str, start: int, end: int, offsets: list):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        offsets.append((start, end))
+
+
+def encode_offsets(offsets: list) -> str:
+    """Flatten sentence offsets into a JSON string; Chroma metadata only holds scalars"""
+    return json.dumps([value for pair in offsets for value in pair], separators=(",", ":"))
+
+
+def decode_offsets(encoded: str) -> list:
+    """Inverse of encode_offsets"""
+    flat = json.loads(encoded)
+    return list(zip(flat[0::2], flat[1::2]))
+
+
+class KeywordMatcher:
+    """
+    Find every search term in a text with one compiled pattern.
+
+    The terms are folded into a single alternation inside a lookahead, so the regex engine walks
+    the text once and reports overlapping occurrences too. Alternatives are tried longest first;
+    shorter terms that share a start position with a longer match ("travel" inside "travels")
+    are recovered from a precomputed prefix table.
+    """
+
+    def __init__(self, terms):
+        self.terms = [term for term in dict.fromkeys(terms) if term]
+        ordered = sorted(self.terms, key=len, reverse=True)
+        self._pattern = re.compile(
+            "(?=(" + "|".join(re.escape(term) for term in ordered) + "))"
+        ) if ordered else None
+        self._prefixes = {
+            term: [other for other in self.terms if other != term and term.startswith(other)]
+            for term in self.terms
+        }
+
+    def finditer(self, text: str):
+        """Yield (start, end, term) for every occurrence of every term"""
+        if self._pattern is None:
+            return
+        for match in self._pattern.finditer(text):
+            term = match.group(1)
+            start = match.start()
+            yield start, start + len(term), term
+            for prefix in self._prefixes[term]:
+                yield start, start + len(prefix), prefix
+
+    def matched_terms(self, text: str) -> set:
+        """The set of terms that occur anywhere in text"""
+        found = set()
+        for _, _, term in self.finditer(text):
+            found.add(term)
+            if len(found) == len(self.terms):
+                break
+        return found
+
+
+@lru_cache(maxsize=256)
+def get_matcher(terms: tuple) -> KeywordMatcher:
+    """Compile a matcher once per distinct set of search terms"""
+    return KeywordMatcher(terms)
+
+
+def matching_sentence_offsets(text_lower: str, offsets: list, matcher: KeywordMatcher):
+    """
+    Map term occurrences onto sentences. Returns (sentence indexes containing a term,
+    whether any term occurred at all).
+    """
+    starts = [start for start, _ in offsets]
+    matched = set()
+    any_match = False
+    for start, end, _ in matcher.finditer(text_lower):
+        any_match = True
+        index = bisect_right(starts, start) - 1
+        if index >= 0 and end <= offsets[index][1]:
+            matched.add(index)
+    return sorted(matched), any_match
@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import time
+from functools import lru_cache
+from collections import namedtuple
+from utils import config
+
+# One pass over the query: words, and runs of punctuation which break phrases apart
+_TOKEN_RE = re.compile(r'(\w+)|[^\w\s]+')
+
+DEFAULT_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are',
+    'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'can', 'what', 'when', 'where', 'why', 'how', 'who', 'which', 'this', 'that',
+    'these', 'those', 'provide', 'show', 'give', 'tell', 'me', 'details', 'about', 'from', 'get', 'find',
+    'search', 'look', 'see', 'want', 'need', 'please', 'you', 'your',
+})
+
+# Common typos and their corrections, expanded both ways
+DEFAULT_SYNONYMS = {
+    'mailestone': ['milestone', 'milestones'],
+    'milestone': ['mailestone', 'milestones'],
+    'detials': ['details'],
+    'details': ['detials'],
+}
+
+# Phrase triggers in the order phrases are reported. "before" captures "<phrase> details",
+# "after" captures "provide <phrase>".
+PHRASE_TRIGGERS = (
+    ('before', 'detail'),
+    ('after', 'provide'),
+    ('after', 'show'),
+    ('before', 'information'),
+    ('before', 'diagram'),
+    ('before', 'architecture'),
+)
+
+QueryAnalysis = namedtuple("QueryAnalysis", ["keywords", "phrases"])
+
+
+def load_lexicon(path: str = None):
+    """Build the stop-word set and synonym table once, merging an optional JSON lexicon file"""
+    stop_words = set(DEFAULT_STOP_WORDS)
+    synonyms = {word: list(variants) for word, variants in DEFAULT_SYNONYMS.items()}
+
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lexicon = json.load(f)
+            stop_words.update(word.lower() for word in lexicon.get("stop_words", []))
+            for word, variants in lexicon.get("synonyms", {}).items():
+                synonyms.setdefault(word.lower(), []).extend(v.lower() for v in variants)
+            print(f"✅ Loaded query lexicon from: {path}")
+        except Exception as e:
+            print(f"⚠️ Failed to load query lexicon {path}: {e}")
+
+    return frozenset(stop_words), {word: tuple(variants) for word, variants in synonyms.items()}
+
+
+STOP_WORDS, SYNONYMS = load_lexicon(config.QUERY_LEXICON_PATH)
+
+
+def tokenize(text: str) -> list:
+    """
+    Split text into runs of word matches separated only by whitespace.
+    Punctuation ends a run, exactly like the \\s+ joins in the original phrase patterns.
+    """
+    runs, current = [], []
+    for match in _TOKEN_RE.finditer(text):
+        if match.group(1) is not None:
+            current.append(match)
+        elif current:
+            runs.append(current)
+            current = []
+    if current:
+        runs.append(current)
+    return runs
+
+
+def _keywords_from_runs(runs: list) -> tuple:
+    keywords = {}
+    for run in runs:
+        for match in run:
+            word = match.group()
+            if word in STOP_WORDS or len(word) <= 1:
+                continue
+            keywords[word] = None
+
+            # Add common singular/plural variations
+            if len(word) > 3:
+                keywords[word[:-1] if word.endswith('s') else word + 's'] = None
+
+            for variant in SYNONYMS.get(word, ()):
+                keywords[variant] = None
+    return tuple(keywords)
+
+
+def _phrases_from_runs(text: str, runs: list) -> tuple:
+    # Phrases are sliced from the text, so they keep its spacing like the original patterns did
+    phrases = []
+    for position, trigger in PHRASE_TRIGGERS:
+        for run in runs:
+            if position == 'before':
+                # Greedy: the phrase extends to the last trigger word in the run
+                for i in range(len(run) - 1, 0, -1):
+                    if run[i].group().startswith(trigger):
+                        phrases.append(text[run[0].start():run[i - 1].end()])
+                        break
+            else:
+                # The first trigger word captures the rest of its run
+                for i in range(len(run) - 1):
+                    if run[i].group().endswith(trigger):
+                        phrases.append(text[run[i + 1].start():run[-1].end()])
+                        break
+    return tuple(phrases)
+
+
+@lru_cache(maxsize=config.QUERY_CACHE_SIZE)
+def analyze_query(text: str) -> QueryAnalysis:
+    """Tokenize a query once and derive both keywords and phrases from the same token runs"""
+    text = text.lower()
+    runs = tokenize(text)
+    return QueryAnalysis(_keywords_from_runs(runs), _phrases_from_runs(text, runs))
+
+
+def extract_keywords(text: str):
+    """Extract important keywords from user query with natural language understanding"""
+    return list(analyze_query(text).keywords)
+
+
+def extract_phrases_and_context(text: str):
+    """Extract important phrases and context from natural language queries"""
+    return list(analyze_query(text).phrases)
+
+
+def benchmark(sizes=(1250, 2500, 5000, 10000), repeat: int = 5):
+    """
+    Time query analysis on adversarial inputs (long runs of words with no trigger, which made the
+    old backtracking patterns blow up). Linear behaviour shows as a flat microseconds-per-char column.
+    """
+    cases = {
+        "words_no_trigger": lambda n: ("ab " * n)[:n],
+        "trigger_at_end": lambda n: ("ab " * n)[:n - 8] + " details",
+        "punctuation_mix": lambda n: ("a.b c! " * n)[:n],
+    }
+    results = []
+    for name, make in cases.items():
+        for size in sizes:
+            text = make(size)
+            best = float("inf")
+            for _ in range(repeat):
+                analyze_query.cache_clear()
+                started = time.perf_counter()
+                analyze_query(text)
+                best = min(best, time.perf_counter() - started)
+            results.append({
+                "case": name,
+                "chars": size,
+                "ms": round(best * 1000, 3),
+                "us_per_char": round(best * 1e6 / size, 4),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    for row in benchmark():
+        print(f"{row['case']:<18} {row['chars']:>6} chars  {row['ms']:>8} ms  {row['us_per_char']:>8} us/char")
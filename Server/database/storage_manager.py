@@ -0,0 +1,202 @@
+import os
+import time
+import shutil
+import sqlite3
+import asyncio
+from filelock import FileLock, Timeout
+from utils import config
+from .index_store import (
+    index_write_lock, get_live_generation, IndexGeneration, activate_generation, discard_generation,
+    discard_generation_path, reserve_generation_path, read_generation_manifest, update_generation_entry,
+    reconcile_generations, generation_content_id, SQLITE_FILE
+)
+
+# Workers that lose the maintenance election check again this often, so one takes over when the holder exits
+MAINTENANCE_CLAIM_RETRY_SECONDS = 60
+
+_maintenance_task = None
+_maintenance_lock = None
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def sqlite_stats(generation_path: str) -> dict:
+    """Size of a generation's SQLite file and how much of it is free pages that VACUUM would give back"""
+    path = os.path.join(generation_path, SQLITE_FILE)
+    if not os.path.exists(path):
+        return {"sqlite_bytes": 0, "reclaimable_bytes": 0}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        conn.close()
+    return {"sqlite_bytes": page_size * page_count, "reclaimable_bytes": page_size * free_pages}
+
+
+def vacuum_sqlite(generation_path: str, timeout: float = 30):
+    """Rewrite the SQLite file without free pages and refresh the planner statistics, as `chroma vacuum` does"""
+    conn = sqlite3.connect(os.path.join(generation_path, SQLITE_FILE), timeout=timeout)
+    try:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+        conn.execute("INSERT INTO maintenance_log (operation, timestamp) VALUES ('vacuum', CURRENT_TIMESTAMP)")
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        # Older stores have no maintenance log; the VACUUM itself has already happened
+        if "maintenance_log" not in str(e):
+            raise
+    finally:
+        conn.close()
+
+
+def disk_usage() -> dict:
+    """Per-generation and total disk use of the index data directory"""
+    live_path = get_live_generation().path
+    generations = []
+    for entry in read_generation_manifest():
+        if not os.path.isdir(entry["path"]):
+            continue
+        generations.append({
+            **entry,
+            "live": entry["path"] == live_path,
+            "size_bytes": directory_size(entry["path"]),
+            **sqlite_stats(entry["path"]),
+        })
+
+    data_dir = config.INDEX_DATA_DIR
+    usage = shutil.disk_usage(data_dir) if os.path.isdir(data_dir) else None
+    return {
+        "data_dir": data_dir,
+        "live_generation": live_path,
+        "data_dir_bytes": directory_size(data_dir),
+        "generations_bytes": sum(generation["size_bytes"] for generation in generations),
+        "reclaimable_bytes": sum(generation["reclaimable_bytes"] for generation in generations),
+        "retain_generations": config.INDEX_RETAIN_GENERATIONS,
+        "disk_free_bytes": usage.free if usage else None,
+        "disk_total_bytes": usage.total if usage else None,
+        "generations": generations,
+    }
+
+
+def _compacted_copy(source_path: str) -> str:
+    """Copy a generation next to itself and vacuum the copy; the source stays untouched and readable"""
+    path = reserve_generation_path()
+    try:
+        shutil.copytree(source_path, path)
+        vacuum_sqlite(path)
+    except Exception:
+        discard_generation_path(path)
+        raise
+    return path
+
+
+async def compact_live_generation(force: bool = False) -> dict:
+    """
+    Compact the live generation by vacuuming a copy and swapping it in like any rebuild, so queries
+    never wait on the exclusive lock VACUUM needs. Skipped unless at least INDEX_COMPACT_MIN_RECLAIM_MB
+    would be reclaimed or force is set. The copy replaces its source, which is deleted once the queries
+    reading it have drained, so the previous build stays the rollback target. The HNSW files are copied
+    as they are: every write path builds a fresh generation, so they never carry deleted entries.
+    """
+    loop = asyncio.get_running_loop()
+    async with index_write_lock():
+        live = get_live_generation()
+        if not os.path.isdir(live.path):
+            # Nothing was indexed yet, so there is no file to compact
+            return {"compacted": False, "generation": live.path, "sqlite_bytes": 0, "reclaimable_bytes": 0}
+        before = await loop.run_in_executor(None, sqlite_stats, live.path)
+        if not force and before["reclaimable_bytes"] < config.INDEX_COMPACT_MIN_RECLAIM_MB * 1024 * 1024:
+            return {"compacted": False, "generation": live.path, **before}
+
+        started = time.perf_counter()
+        expected = live.collection.count()
+        path = await loop.run_in_executor(None, _compacted_copy, live.path)
+        compacted = IndexGeneration(path)
+        if compacted.collection.count() != expected:
+            discard_generation(compacted)
+            raise ValueError(f"Compacted copy of {live.path} holds {compacted.collection.count()} documents, expected {expected}")
+        content_id = generation_content_id(live.path)
+        activate_generation(compacted, replace_previous=True)
+        update_generation_entry(path, compacted_at=time.time(), content_id=content_id)
+        after = await loop.run_in_executor(None, sqlite_stats, path)
+
+    print(f"🗜️ Compacted index generation {live.path} into {path} in {time.perf_counter() - started:.1f}s, "
+          f"SQLite {before['sqlite_bytes']} -> {after['sqlite_bytes']} bytes")
+    return {
+        "compacted": True,
+        "generation": path,
+        "previous_generation": live.path,
+        "sqlite_bytes_before": before["sqlite_bytes"],
+        "sqlite_bytes_after": after["sqlite_bytes"],
+    }
+
+
+async def reconcile_storage() -> dict:
+    async with index_write_lock():
+        return await asyncio.get_running_loop().run_in_executor(None, reconcile_generations)
+
+
+def _claim_maintenance() -> bool:
+    """Elect this process to run maintenance; the lock is held until the process exits"""
+    global _maintenance_lock
+    os.makedirs(os.path.dirname(config.INDEX_MAINTENANCE_LOCK_PATH) or ".", exist_ok=True)
+    lock = FileLock(config.INDEX_MAINTENANCE_LOCK_PATH, thread_local=False)
+    try:
+        lock.acquire(timeout=0)
+    except Timeout:
+        return False
+    _maintenance_lock = lock
+    return True
+
+
+async def _maintenance_loop():
+    # With several workers only one reconciles and compacts; the others wait for the role to free up
+    while not _claim_maintenance():
+        await asyncio.sleep(MAINTENANCE_CLAIM_RETRY_SECONDS)
+    print(f"🗂️ Index storage maintenance runs in process {os.getpid()}")
+
+    try:
+        result = await reconcile_storage()
+        print(f"🗂️ Index storage reconciled, live generation: {result['live']}")
+    except Exception as e:
+        print(f"⚠️ Index storage reconcile failed: {e}")
+
+    if config.INDEX_COMPACT_INTERVAL_MINUTES <= 0:
+        return
+    while True:
+        await asyncio.sleep(config.INDEX_COMPACT_INTERVAL_MINUTES * 60)
+        try:
+            await compact_live_generation()
+        except Exception as e:
+            print(f"⚠️ Background index compaction failed: {e}")
+
+
+def start_storage_maintenance():
+    """
+    Reconcile the generation manifest now and compact the live generation periodically in the background,
+    in one worker process only
+    """
+    global _maintenance_task
+    if _maintenance_task is None or _maintenance_task.done():
+        _maintenance_task = asyncio.get_running_loop().create_task(_maintenance_loop())
+
+
+def stop_storage_maintenance():
+    global _maintenance_task, _maintenance_lock
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        _maintenance_task = None
+    if _maintenance_lock is not None:
+        _maintenance_lock.release()
+        _maintenance_lock = None
@@ -0,0 +1,150 @@
+import io
+import os
+import csv
+import textract
+from xml.etree import ElementTree
+
+# Extractors hand text on in blocks of roughly this many characters
+BLOCK_CHARS = 64 * 1024
+
+PLAIN_TEXT_EXTENSIONS = {'.txt', '.log'}
+DELIMITED_EXTENSIONS = {'.csv': ',', '.tsv': '\t', '.tab': '\t', '.psv': '|'}
+WORKBOOK_EXTENSIONS = {'.xls', '.xlsx'}
+
+
+def _blocks(lines):
+    """Group many small pieces of text into blocks of about BLOCK_CHARS"""
+    pending, size = [], 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= BLOCK_CHARS:
+            yield "".join(pending)
+            pending, size = [], 0
+    if pending:
+        yield "".join(pending)
+
+
+def _plain_text(file_path: str):
+    with open(file_path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        for block in iter(lambda: f.read(BLOCK_CHARS), ""):
+            yield block
+
+
+def _delimited_rows(file_path: str, delimiter: str):
+    # Cells are joined with tabs like textract does, so every cell stays a separate word
+    with open(file_path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        yield from _blocks("\t".join(row) + "\n" for row in csv.reader(f, delimiter=delimiter))
+
+
+def _xml_elements(file_path: str):
+    """Tag, attributes and text of each element, released as soon as the element is closed"""
+    def lines():
+        open_elements = []
+        for event, element in ElementTree.iterparse(file_path, events=("start", "end")):
+            if event == "start":
+                open_elements.append(element)
+                continue
+            open_elements.pop()
+            tag = element.tag.rpartition("}")[2]
+            parts = [tag] + [f"{name.rpartition('}')[2]} {value}" for name, value in element.attrib.items()]
+            text = (element.text or "").strip()
+            if text:
+                parts.append(text)
+            if len(parts) > 1:
+                yield " ".join(parts) + "\n"
+            tail = (element.tail or "").strip()
+            if tail:
+                yield tail + "\n"
+            # Closed elements are detached from their parent so memory stays flat on huge documents
+            element.clear()
+            if open_elements:
+                open_elements[-1].remove(element)
+
+    yield from _blocks(lines())
+
+
+def _pdf_pages(file_path: str):
+    """One block per page through pdfminer's page interpreter instead of the whole document at once"""
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    manager = PDFResourceManager(caching=True)
+    buffer = io.StringIO()
+    device = TextConverter(manager, buffer, laparams=LAParams())
+    interpreter = PDFPageInterpreter(manager, device)
+    try:
+        with open(file_path, "rb") as f:
+            for page in PDFPage.get_pages(f, caching=True):
+                interpreter.process_page(page)
+                yield buffer.getvalue() + "\n"
+                buffer.seek(0)
+                buffer.truncate(0)
+    finally:
+        device.close()
+
+
+def _workbook_rows(file_path: str):
+    import xlrd
+
+    # on_demand loads one sheet at a time for .xls; .xlsx is parsed up front by xlrd
+    book = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        for index in range(book.nsheets):
+            sheet = book.sheet_by_index(index)
+            yield from _blocks(
+                " ".join(str(value) for value in sheet.row_values(row)) + "\n" for row in range(sheet.nrows)
+            )
+            book.unload_sheet(index)
+    finally:
+        book.release_resources()
+
+
+def _textract(file_path: str):
+    yield textract.process(file_path).decode("utf-8")
+
+
+def iter_text(file_path: str):
+    """
+    Yield the text of a file in blocks: text and delimited files line by line, XML element by element,
+    PDFs page by page and workbooks row by row. Other formats go through textract in one piece.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in PLAIN_TEXT_EXTENSIONS:
+        return _plain_text(file_path)
+    if extension in DELIMITED_EXTENSIONS:
+        return _delimited_rows(file_path, DELIMITED_EXTENSIONS[extension])
+    if extension == '.xml':
+        return _xml_elements(file_path)
+    if extension == '.pdf':
+        return _pdf_pages(file_path)
+    if extension in WORKBOOK_EXTENSIONS:
+        return _workbook_rows(file_path)
+    return _textract(file_path)
+
+
+def chunk_stream(blocks, chunk_size: int = 500):
+    """
+    Yield the same chunks chunk_text would produce for the concatenated blocks, each as soon as it
+    has chunk_size words, holding no more than one chunk of words in memory.
+    """
+    words = []
+    carry = ""
+    for block in blocks:
+        if not block:
+            continue
+        text = carry + block
+        parts = text.split()
+        # A block that ends inside a word continues in the next one
+        carry = parts.pop() if parts and not text[-1].isspace() else ""
+        words.extend(parts)
+        while len(words) >= chunk_size:
+            yield " ".join(words[:chunk_size])
+            del words[:chunk_size]
+    if carry:
+        words.append(carry)
+    while words:
+        yield " ".join(words[:chunk_size])
+        del words[:chunk_size]
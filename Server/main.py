@@ -9,6 +9,8 @@ from middleware import middleware
 
 from utils import *
 from utils import config, SuccessResponse
+from database.storage_manager import start_storage_maintenance, stop_storage_maintenance
+from database.context_budget import load_tokenizer
 
 # Import only the router object from router/router.py
 from router import router as main_router
@@ -25,13 +27,23 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-# Add all other middleware (SuccessResponse, Exception Handlers)
+# Add all other middleware (compression, exception handlers)
 middleware(app)
 
 # Include the router from the router folder
 app.include_router(main_router)
 
 
+@app.on_event("startup")
+async def start_background_tasks():
+    start_storage_maintenance()
+    await load_tokenizer()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    stop_storage_maintenance()
+
+
 @app.get("/")
 def read_root():
     resp = SuccessResponse(data=None, message="Welcome to MyACCOBot FastAPI server!")
@@ -52,5 +64,34 @@ def api_test_post():
     """Test API POST endpoint"""
     return {"message": "API POST test successful"}
 
+def run_production():
+    """Run several workers that share one embedding service process and one published index"""
+    import os
+    import time
+    import multiprocessing
+    from database.embedding_service import run_embedding_service, RemoteEmbeddingModel
+
+    address = config.EMBEDDING_SERVICE_ADDRESS or f"127.0.0.1:{config.EMBEDDING_SERVICE_PORT}"
+    service = multiprocessing.Process(target=run_embedding_service, args=(address,), daemon=True)
+    service.start()
+
+    # Wait for the model to load before accepting traffic
+    probe = RemoteEmbeddingModel(address, timeout=5)
+    while not probe.ping():
+        if not service.is_alive():
+            raise RuntimeError("Embedding service failed to start")
+        time.sleep(0.5)
+
+    # Workers read this from the environment and use the shared service instead of loading the model
+    os.environ["EMBEDDING_SERVICE_ADDRESS"] = address
+    print(f"🚀 Starting {config.SERVER_WORKERS} workers")
+    try:
+        uvicorn.run("main:app", host=config.BACKEND_HOST, port=config.BACKEND_PORT, workers=config.SERVER_WORKERS)
+    finally:
+        service.terminate()
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host=config.BACKEND_HOST, port=config.BACKEND_PORT, reload=True)
+    if config.SERVER_WORKERS > 1:
+        run_production()
+    else:
+        uvicorn.run("main:app", host=config.BACKEND_HOST, port=config.BACKEND_PORT, reload=True)
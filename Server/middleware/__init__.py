@@ -2,7 +2,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .exception_handling import add_exception_handlers
-from .success_response import SuccessResponseMiddleware
+from .compression import CompressionMiddleware
 from utils import config
 
 def middleware(app: FastAPI):
@@ -10,9 +10,17 @@ def middleware(app: FastAPI):
 	print(f"CORS Configuration - Allowed Origins: {config.ALLOWED_ORIGINS}")
 	print("CORS middleware disabled - using custom bypass in main.py")
 	
-	# Temporarily disable SuccessResponse middleware to fix Content-Length issue
-	# app.add_middleware(SuccessResponseMiddleware)
-	print("SuccessResponse middleware temporarily disabled")
+	# Routers wrap responses in the success envelope while rendering (EnvelopeJSONResponse), so no
+	# middleware has to re-parse bodies; compression only touches complete JSON bodies
+	if config.RESPONSE_COMPRESSION_ENABLED:
+		app.add_middleware(CompressionMiddleware, minimum_size=config.RESPONSE_COMPRESSION_MIN_BYTES)
+		print(f"Response compression enabled for JSON bodies from {config.RESPONSE_COMPRESSION_MIN_BYTES} bytes")
 	
+	# Request profiling hooks only exist when the debug endpoints are enabled
+	if config.DEBUG_ENDPOINTS_ENABLED:
+		from utils.profiling import ProfilingMiddleware
+		app.add_middleware(ProfilingMiddleware)
+		print("⚠️ Debug profiling endpoints enabled at /api/debug")
+
 	# Add global exception handlers
 	add_exception_handlers(app)
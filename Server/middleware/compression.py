@@ -0,0 +1,91 @@
+import gzip
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    # br is only offered when the optional brotli package is installed
+    brotli = None
+
+
+def _accepted_encodings(scope) -> set:
+    accepted = set()
+    for part in Headers(scope=scope).get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Compress complete JSON bodies of at least minimum_size bytes with br (when brotli is installed)
+    or gzip, whichever the client accepts. Only responses with a Content-Length and a single body
+    message are touched; streaming and chunked responses pass through without being buffered.
+    """
+
+    def __init__(self, app, minimum_size: int = 4096, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _encoding(self, scope):
+        accepted = _accepted_encodings(scope)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _eligible(self, message) -> bool:
+        headers = Headers(raw=message.get("headers", []))
+        length = headers.get("content-length")
+        return (
+            length is not None and length.isdigit() and int(length) >= self.minimum_size
+            and "content-encoding" not in headers
+            and headers.get("content-type", "").startswith("application/json")
+        )
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        encoding = self._encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        held_start = None
+
+        async def send_wrapper(message):
+            nonlocal held_start
+            if message["type"] == "http.response.start":
+                if self._eligible(message):
+                    # Hold the headers until the body shows whether it arrives in one piece
+                    held_start = message
+                    return
+                await send(message)
+                return
+
+            if message["type"] == "http.response.body" and held_start is not None:
+                start, held_start = held_start, None
+                if message.get("more_body", False):
+                    await send(start)
+                    await send(message)
+                    return
+                body = self._compress(encoding, message.get("body", b""))
+                headers = MutableHeaders(raw=list(start["headers"]))
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                await send({**start, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
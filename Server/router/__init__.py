@@ -1,11 +1,16 @@
 from fastapi import APIRouter
 from .conversation_router import router as conversation_router
 from .source_dir_router import router as source_dir_router
-from utils import config
+from utils import config, EnvelopeJSONResponse
 
-router = APIRouter(prefix=config.BACKEND_API_ENDPOINT)
+# Every response is rendered straight into the {success, message, data} envelope
+router = APIRouter(prefix=config.BACKEND_API_ENDPOINT, default_response_class=EnvelopeJSONResponse)
 
 router.include_router(conversation_router, prefix="/chat", tags=["Conversation"])
 router.include_router(source_dir_router, prefix="/source", tags=["Source Dir"])
 
+if config.DEBUG_ENDPOINTS_ENABLED:
+    from .debug_router import router as debug_router
+    router.include_router(debug_router, prefix="/debug", tags=["Debug"])
+
 __all__ = ["router"]
@@ -0,0 +1,73 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Query
+from Schema.debug_schema import RequestProfilePayload, SamplingPayload, MemoryStartPayload, LoopLagPayload
+from Controller.debug_controller import debug_controller, require_debug_access
+
+# Only mounted when DEBUG_ENDPOINTS_ENABLED is set
+router = APIRouter(dependencies=[Depends(require_debug_access)])
+
+GroupBy = Literal["lineno", "filename", "traceback"]
+
+@router.post("/profile/requests")
+async def arm_request_profile(payload: RequestProfilePayload):
+    return debug_controller.arm_request_profile(payload)
+
+@router.get("/profile/requests")
+async def request_profile_status():
+    return debug_controller.request_profile_status()
+
+@router.delete("/profile/requests")
+async def cancel_request_profile():
+    return debug_controller.cancel_request_profile()
+
+@router.post("/profile/sampling/start")
+async def start_sampling(payload: SamplingPayload):
+    return debug_controller.start_sampling(payload)
+
+@router.post("/profile/sampling/stop")
+async def stop_sampling():
+    return debug_controller.stop_sampling()
+
+@router.get("/profiles")
+async def list_profiles():
+    return debug_controller.list_profiles()
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: Optional[Literal["pstats", "collapsed", "json"]] = None):
+    return debug_controller.download_profile(profile_id, format)
+
+@router.post("/memory/start")
+async def start_memory(payload: MemoryStartPayload):
+    return debug_controller.start_memory(payload)
+
+@router.post("/memory/stop")
+async def stop_memory():
+    return debug_controller.stop_memory()
+
+@router.get("/memory")
+async def memory_status():
+    return debug_controller.memory_status()
+
+@router.post("/memory/snapshots")
+async def take_memory_snapshot():
+    return debug_controller.take_memory_snapshot()
+
+@router.get("/memory/snapshots/{snapshot_id}")
+async def memory_top(snapshot_id: str, limit: int = Query(25, ge=1, le=500), group_by: GroupBy = "lineno"):
+    return debug_controller.memory_top(snapshot_id, limit, group_by)
+
+@router.get("/memory/diff")
+async def memory_diff(base: str, target: str = "latest", limit: int = Query(25, ge=1, le=500), group_by: GroupBy = "lineno"):
+    return debug_controller.memory_diff(base, target, limit, group_by)
+
+@router.post("/loop-lag/start")
+async def start_loop_lag(payload: LoopLagPayload):
+    return debug_controller.start_loop_lag(payload)
+
+@router.post("/loop-lag/stop")
+async def stop_loop_lag():
+    return debug_controller.stop_loop_lag()
+
+@router.get("/loop-lag")
+async def loop_lag_report():
+    return debug_controller.loop_lag_report()
@@ -1,6 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from Schema.source_dir_schema import RoutePathPayload
+from Schema.source_dir_schema import RoutePathPayload, StorageCompactPayload
 from Controller import source_dir_controller
 
 
@@ -10,9 +9,32 @@ router = APIRouter()
 async def device(payload: RoutePathPayload):
     # Implement your logic here
     result = await source_dir_controller.browse_drive(payload)
-    return JSONResponse(content=result)
+    return result
 
 @router.post("/google_drive")
 async def google_drive(payload: RoutePathPayload):
-    # Implement your logic here
-    return source_dir_controller.google_drive(payload)
\ No newline at end of file
+    # payload.path is a Drive folder id or folder URL
+    result = await source_dir_controller.google_drive(payload)
+    return result
+
+@router.post("/snapshot/export")
+async def export_snapshot(payload: RoutePathPayload):
+    # payload.path names the snapshot file inside SNAPSHOT_DIR on the server
+    result = await source_dir_controller.export_snapshot(payload)
+    return result
+
+@router.post("/snapshot/import")
+async def import_snapshot(payload: RoutePathPayload):
+    result = await source_dir_controller.import_snapshot(payload)
+    return result
+
+@router.get("/storage")
+async def storage_usage():
+    # Disk use of every index generation kept on disk
+    result = await source_dir_controller.storage_usage()
+    return result
+
+@router.post("/storage/compact")
+async def compact_storage(payload: StorageCompactPayload):
+    result = await source_dir_controller.compact_storage(payload)
+    return result
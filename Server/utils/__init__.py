@@ -1,4 +1,5 @@
 from .config import config
-from .handling_response import SuccessResponse, ErrorResponse
+from .handling_response import SuccessResponse, ErrorResponse, EnvelopeJSONResponse
+from .admission_control import AdmissionGate, SingleFlight
 
-__all__ = ["config", "SuccessResponse", "ErrorResponse"]
\ No newline at end of file
+__all__ = ["config", "SuccessResponse", "ErrorResponse", "EnvelopeJSONResponse", "AdmissionGate", "SingleFlight"]
\ No newline at end of file
@@ -0,0 +1,80 @@
+import math
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+
+
+class AdmissionGate:
+    """
+    Bound how many requests do heavy work at once. Excess requests wait in a bounded queue
+    for at most max_wait seconds; beyond that they are turned away with Retry-After.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_wait: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = str(max(1, math.ceil(max_wait)))
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        # Requests running or queued; counted by hand so a burst arriving in one tick is bounded too
+        self._admitted = 0
+
+    async def _acquire(self) -> bool:
+        """
+        Wait up to max_wait for a slot. wait_for can drop a slot granted just as the timeout fires,
+        so the acquire runs as its own task: cancelling it while pending never holds a slot, and a
+        slot granted before the caller itself is cancelled is handed back.
+        """
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            await asyncio.wait((acquire,), timeout=self.max_wait)
+        except BaseException:
+            if acquire.done() and not acquire.cancelled():
+                self._semaphore.release()
+            else:
+                acquire.cancel()
+            raise
+        if not acquire.done():
+            acquire.cancel()
+            return False
+        return True
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._admitted >= self.max_concurrent + self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests in progress, please retry shortly",
+                headers={"Retry-After": self.retry_after},
+            )
+
+        self._admitted += 1
+        try:
+            if not await self._acquire():
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please retry shortly",
+                    headers={"Retry-After": self.retry_after},
+                )
+            try:
+                yield
+            finally:
+                self._semaphore.release()
+        finally:
+            self._admitted -= 1
+
+
+class SingleFlight:
+    """Let identical concurrent calls share one execution and its result"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Shielded so a caller that disconnects does not cancel the call for everyone else
+        return await asyncio.shield(task)
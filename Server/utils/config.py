@@ -20,6 +20,93 @@ class Config:
 		# Allowed origins for CORS
 		# Always allow all origins for now to fix Electron CORS issues
 		self.ALLOWED_ORIGINS = ["*"]
+
+		# Ingestion de-duplication (exact hash + SimHash near-duplicates)
+		self.DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() == 'true'
+		self.DEDUP_MAX_HAMMING_DISTANCE = int(os.getenv('DEDUP_MAX_HAMMING_DISTANCE', 3))
+
+		# Prompt context budgeting for the local LLM
+		# tokenizer.json of the local LLM; when the file is missing it is fetched once from the LLM_TOKENIZER
+		# Hub repo (e.g. mistralai/Mistral-7B-v0.1, gated: needs HF_TOKEN), or read from the cache only when HF_HUB_OFFLINE is set
+		self.LLM_TOKENIZER_FILE = os.getenv('LLM_TOKENIZER_FILE', './data/tokenizer/tokenizer.json')
+		self.LLM_TOKENIZER = os.getenv('LLM_TOKENIZER', '')
+		self.HF_HUB_OFFLINE = os.getenv('HF_HUB_OFFLINE', '0').lower() in ('1', 'true', 'yes', 'on')
+		self.PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 1024))
+		self.LLM_PREFILL_MS_PER_TOKEN = float(os.getenv('LLM_PREFILL_MS_PER_TOKEN', 25))
+
+		# Query analysis: optional JSON file with extra stop words and synonym/typo variants
+		self.QUERY_LEXICON_PATH = os.getenv('QUERY_LEXICON_PATH', '')
+		self.QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 1024))
+
+		# Serving: more than one worker runs the production mode with a shared embedding service
+		self.SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 1))
+		self.EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'hkunlp/instructor-base')
+		self.EMBEDDING_SERVICE_ADDRESS = os.getenv('EMBEDDING_SERVICE_ADDRESS', '')
+		self.EMBEDDING_SERVICE_PORT = int(os.getenv('EMBEDDING_SERVICE_PORT', 4001))
+
+		# Query embeddings: micro-batching window, batch cap and LRU size
+		self.QUERY_EMBED_MAX_BATCH = int(os.getenv('QUERY_EMBED_MAX_BATCH', 16))
+		self.QUERY_EMBED_MAX_DELAY_MS = float(os.getenv('QUERY_EMBED_MAX_DELAY_MS', 3))
+		self.QUERY_EMBED_CACHE_SIZE = int(os.getenv('QUERY_EMBED_CACHE_SIZE', 256))
+
+		# Vector search fallback when no chunk matches the query terms literally
+		self.VECTOR_SEARCH_ENABLED = os.getenv('VECTOR_SEARCH_ENABLED', 'true').lower() == 'true'
+		self.VECTOR_SEARCH_MAX_DISTANCE = float(os.getenv('VECTOR_SEARCH_MAX_DISTANCE', 0.25))
+
+		# Index generations are published through a pointer file and written by one process at a time
+		self.INDEX_POINTER_PATH = os.getenv('INDEX_POINTER_PATH', './data/current_index.json')
+		self.INDEX_WRITE_LOCK_PATH = os.getenv('INDEX_WRITE_LOCK_PATH', './data/index_write.lock')
+		self.INDEX_DATA_DIR = os.getenv('INDEX_DATA_DIR', './data')
+		# Seconds a replaced generation is kept after its last local query so other workers can drain too
+		self.INDEX_RETIRE_GRACE_SECONDS = float(os.getenv('INDEX_RETIRE_GRACE_SECONDS', 30))
+		# Manifest of index generations, how many replaced generations are kept on disk, and background compaction
+		# of the live one (interval 0 disables it; it only runs when at least INDEX_COMPACT_MIN_RECLAIM_MB is free space)
+		self.INDEX_MANIFEST_PATH = os.getenv('INDEX_MANIFEST_PATH', './data/index_generations.json')
+		self.INDEX_RETAIN_GENERATIONS = int(os.getenv('INDEX_RETAIN_GENERATIONS', 1))
+		self.INDEX_COMPACT_INTERVAL_MINUTES = float(os.getenv('INDEX_COMPACT_INTERVAL_MINUTES', 60))
+		self.INDEX_COMPACT_MIN_RECLAIM_MB = float(os.getenv('INDEX_COMPACT_MIN_RECLAIM_MB', 16))
+		# Held by the one worker process that reconciles and compacts the index
+		self.INDEX_MAINTENANCE_LOCK_PATH = os.getenv('INDEX_MAINTENANCE_LOCK_PATH', './data/index_maintenance.lock')
+		# Snapshots exported and imported through the API are confined to this directory
+		self.SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', './data/snapshots')
+
+		# Chat admission control: concurrent chats, queued chats, and how long a queued chat may wait
+		self.CHAT_MAX_CONCURRENCY = int(os.getenv('CHAT_MAX_CONCURRENCY', 2))
+		self.CHAT_MAX_QUEUE = int(os.getenv('CHAT_MAX_QUEUE', 8))
+		self.CHAT_MAX_WAIT_SECONDS = float(os.getenv('CHAT_MAX_WAIT_SECONDS', 30))
+
+		# Folder scanning: comma-separated glob patterns, limits (0 / -1 = unlimited) and symlink policy (none, files, all)
+		self.SCAN_INCLUDE = [p.strip() for p in os.getenv('SCAN_INCLUDE', '').split(',') if p.strip()]
+		self.SCAN_EXCLUDE = [p.strip() for p in os.getenv('SCAN_EXCLUDE', '').split(',') if p.strip()]
+		self.SCAN_MAX_FILE_SIZE_MB = float(os.getenv('SCAN_MAX_FILE_SIZE_MB', 0))
+		self.SCAN_MAX_DEPTH = int(os.getenv('SCAN_MAX_DEPTH', -1))
+		self.SCAN_SYMLINKS = os.getenv('SCAN_SYMLINKS', 'files').lower()
+		self.SCAN_SKIP_HIDDEN = os.getenv('SCAN_SKIP_HIDDEN', 'true').lower() == 'true'
+		# Files extracted concurrently while the scan is still running, and how far the scan may run ahead
+		self.INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 4))
+		self.SCAN_QUEUE_SIZE = int(os.getenv('SCAN_QUEUE_SIZE', 256))
+		# Chunks embedded and written per batch while files are still being extracted
+		self.INGEST_EMBED_BATCH_SIZE = int(os.getenv('INGEST_EMBED_BATCH_SIZE', 64))
+		# Numbers from XML/CSV/XLS(X) files go to a fact table that answers aggregate questions without the LLM
+		self.FACTS_ENABLED = os.getenv('FACTS_ENABLED', 'true').lower() == 'true'
+
+		# Google Drive connector: API base URL (point it at a mock server for tests), credentials and download pool
+		self.GOOGLE_DRIVE_API_URL = os.getenv('GOOGLE_DRIVE_API_URL', 'https://www.googleapis.com/drive/v3').rstrip('/')
+		self.GOOGLE_DRIVE_CREDENTIALS_FILE = os.getenv('GOOGLE_DRIVE_CREDENTIALS_FILE', '')
+		self.GOOGLE_DRIVE_ACCESS_TOKEN = os.getenv('GOOGLE_DRIVE_ACCESS_TOKEN', '')
+		self.GOOGLE_DRIVE_CACHE_DIR = os.getenv('GOOGLE_DRIVE_CACHE_DIR', './data/google_drive')
+		self.GOOGLE_DRIVE_MAX_CONNECTIONS = int(os.getenv('GOOGLE_DRIVE_MAX_CONNECTIONS', 8))
+		self.GOOGLE_DRIVE_TIMEOUT_SECONDS = float(os.getenv('GOOGLE_DRIVE_TIMEOUT_SECONDS', 60))
+		self.GOOGLE_DRIVE_MAX_RETRIES = int(os.getenv('GOOGLE_DRIVE_MAX_RETRIES', 3))
+
+		# Debug profiling endpoints (/api/debug): off unless enabled; without a token only loopback clients may use them
+		self.DEBUG_ENDPOINTS_ENABLED = os.getenv('DEBUG_ENDPOINTS_ENABLED', 'false').lower() == 'true'
+		self.DEBUG_TOKEN = os.getenv('DEBUG_TOKEN', '')
+		self.DEBUG_MAX_PROFILES = int(os.getenv('DEBUG_MAX_PROFILES', 10))
+
+		# Compression of large JSON responses: br when the brotli package is installed, gzip otherwise
+		self.RESPONSE_COMPRESSION_ENABLED = os.getenv('RESPONSE_COMPRESSION_ENABLED', 'false').lower() == 'true'
+		self.RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', 4096))
 		print(f"Backend running on: {self.BACKEND_HOST}:{self.BACKEND_PORT}")
 		print(f"CORS allowed origins: {self.ALLOWED_ORIGINS}")
 
@@ -1,3 +1,10 @@
+import orjson
+from starlette.responses import Response
+
+# numpy values and int keys serialize as they are when the class is used directly, e.g. from handlers
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
 class SuccessResponse:
     def __init__(self, data=None, message="Request processed successfully"):
         self.success = True
@@ -23,3 +30,70 @@ class ErrorResponse:
             "message": self.message,
             "errors": self.errors
         }
+
+
+def _orjson_default(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class EnvelopeJSONResponse(Response):
+    """
+    JSON response that wraps successful payloads in the SuccessResponse envelope while serializing,
+    in a single orjson pass. Payloads that already carry "success" and error statuses are sent as they are.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if self.status_code < 400 and not (isinstance(content, dict) and "success" in content):
+            content = SuccessResponse(data=content).dict()
+        return orjson.dumps(content, default=_orjson_default, option=ORJSON_OPTIONS)
+
+
+if __name__ == "__main__":
+    # Serialization cost per chat response: re-parsing envelope middleware vs. envelope at render time
+    import json
+    import gzip
+    import timeit
+    from starlette.responses import JSONResponse
+
+    def chat_payload(sources: int) -> dict:
+        return {
+            "answer": "Total travel expenses for 2024-03: 4,540.00 from 3 values. " * 8,
+            "sources": [
+                {"source": f"/data/reports/2024/expense_report_{i}.xml", "chunk_index": i,
+                 "sentence_offsets": ",".join(str(n * 37) for n in range(40)), "duplicate_count": i % 3,
+                 "sources": json.dumps([f"/data/reports/2024/copy_{i}_{k}.xml" for k in range(3)])}
+                for i in range(sources)
+            ],
+            "usage": {"prompt_tokens": 956, "context_tokens_before_budget": 2385, "estimated_time_saved_ms": 39525.0},
+        }
+
+    def reparse(payload: dict) -> bytes:
+        # What SuccessResponseMiddleware did: render, parse the body again, wrap and render once more
+        body = JSONResponse(payload).body
+        return json.dumps(SuccessResponse(data=json.loads(body.decode())).dict()).encode()
+
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    print(f"{'sources':>8} {'bytes':>8} {'reparse µs':>11} {'envelope µs':>12} {'speedup':>8} {'gzip µs':>8} {'gzip bytes':>11}"
+          + (f" {'br µs':>8} {'br bytes':>9}" if brotli else ""))
+    for sources in (0, 5, 20, 100):
+        payload = chat_payload(sources)
+        runs = max(50, 20000 // (sources + 1))
+        old = timeit.timeit(lambda: reparse(payload), number=runs) / runs * 1e6
+        new = timeit.timeit(lambda: EnvelopeJSONResponse(payload).body, number=runs) / runs * 1e6
+        body = EnvelopeJSONResponse(payload).body
+        gz = timeit.timeit(lambda: gzip.compress(body, 6), number=runs) / runs * 1e6
+        row = (f"{sources:>8} {len(body):>8} {old:>11.1f} {new:>12.1f} {old / new:>7.1f}x {gz:>8.1f} "
+               f"{len(gzip.compress(body, 6)):>11}")
+        if brotli:
+            br = timeit.timeit(lambda: brotli.compress(body, quality=4), number=runs) / runs * 1e6
+            row += f" {br:>8.1f} {len(brotli.compress(body, quality=4)):>9}"
+        print(row)
@@ -0,0 +1,388 @@
+import io
+import os
+import sys
+import time
+import json
+import asyncio
+import marshal
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter, OrderedDict, deque
+from .config import config
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling of every thread's stack at a fixed interval. Unlike cProfile this sees executor
+    threads (extraction, embedding), costs the same however deep the code goes, and can be attached to
+    work that is already running.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.time()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if self.samples % 100 == 0:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format, readable by flamegraph.pl and speedscope"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def summary(self, limit: int = 50) -> dict:
+        own, total = Counter(), Counter()
+        for stack, count in self.counts.items():
+            frames = stack.split(";")[1:]
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "duration_seconds": round((self.stopped_at or time.time()) - self.started_at, 3),
+            "top_self": [{"frame": frame, "samples": count} for frame, count in own.most_common(limit)],
+            "top_total": [{"frame": frame, "samples": count} for frame, count in total.most_common(limit)],
+        }
+
+
+def _cprofile_summary(stats: pstats.Stats, limit: int = 50) -> dict:
+    rows = []
+    for (filename, line, function), (primitive_calls, calls, own_time, cumulative_time, _) in stats.stats.items():
+        rows.append({
+            "function": f"{function} ({os.path.basename(filename)}:{line})",
+            "calls": calls,
+            "primitive_calls": primitive_calls,
+            "own_seconds": round(own_time, 6),
+            "cumulative_seconds": round(cumulative_time, 6),
+        })
+    rows.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+    return {"total_seconds": round(stats.total_tt, 6), "top_cumulative": rows[:limit]}
+
+
+class ProfileResult:
+    """A finished capture, renderable as pstats, collapsed stacks or JSON depending on its kind"""
+
+    def __init__(self, profile_id: str, kind: str, details: dict, stats: pstats.Stats = None, sampler: SamplingProfiler = None):
+        self.id = profile_id
+        self.kind = kind
+        self.details = details
+        self.created_at = time.time()
+        self.stats = stats
+        self.sampler = sampler
+
+    @property
+    def formats(self):
+        return ("pstats", "json") if self.kind == "cprofile" else ("collapsed", "json")
+
+    def render(self, output_format: str):
+        """Return (bytes, media type, file extension)"""
+        if output_format not in self.formats:
+            raise ValueError(f"{self.kind} profiles can be downloaded as {', '.join(self.formats)}")
+        if output_format == "pstats":
+            # Same bytes pstats.Stats.dump_stats writes; load with pstats.Stats(path) or snakeviz
+            return marshal.dumps(self.stats.stats), "application/octet-stream", "pstats"
+        if output_format == "collapsed":
+            return self.sampler.collapsed().encode("utf-8"), "text/plain", "collapsed.txt"
+        summary = _cprofile_summary(self.stats) if self.kind == "cprofile" else self.sampler.summary()
+        return json.dumps(self.describe() | summary, indent=2).encode("utf-8"), "application/json", "json"
+
+    def describe(self) -> dict:
+        return {"id": self.id, "kind": self.kind, "created_at": self.created_at, "formats": list(self.formats), **self.details}
+
+
+class ProfileStore:
+    """The last few finished captures of this worker"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._results = OrderedDict()
+        self._counter = 0
+
+    def add(self, kind: str, details: dict, **data) -> ProfileResult:
+        self._counter += 1
+        result = ProfileResult(f"{kind}-{self._counter}", kind, details, **data)
+        self._results[result.id] = result
+        while len(self._results) > self.limit:
+            self._results.popitem(last=False)
+        return result
+
+    def get(self, profile_id: str):
+        return self._results.get(profile_id)
+
+    def list(self) -> list:
+        return [result.describe() for result in reversed(self._results.values())]
+
+
+class RequestCapture:
+    """
+    Profile the next `count` requests whose path starts with path_prefix. cProfile only sees the event
+    loop thread, and while a profiled request awaits, other coroutines on the loop are counted too.
+    """
+
+    def __init__(self, count: int, path_prefix: str, mode: str, interval: float):
+        self.count = count
+        self.path_prefix = path_prefix
+        self.mode = mode
+        self.remaining = count
+        self.in_flight = 0
+        self.requests = []
+        self._profile = cProfile.Profile() if mode == "cprofile" else None
+        self._sampler = SamplingProfiler(interval) if mode == "sampling" else None
+
+    def claim(self, path: str) -> bool:
+        if self.remaining <= 0 or not path.startswith(self.path_prefix):
+            return False
+        self.remaining -= 1
+        if self.in_flight == 0:
+            if self._profile is not None:
+                self._profile.enable()
+            elif self._sampler.started_at is None:
+                self._sampler.start()
+        self.in_flight += 1
+        return True
+
+    def release(self, method: str, path: str, status: int, elapsed: float) -> bool:
+        """Returns True once the last claimed request has finished"""
+        self.in_flight -= 1
+        self.requests.append({"method": method, "path": path, "status": status, "ms": round(elapsed * 1000, 2)})
+        if self.in_flight == 0 and self._profile is not None:
+            self._profile.disable()
+        return self.remaining == 0 and self.in_flight == 0
+
+    def finish(self) -> ProfileResult:
+        details = {"requests": self.requests, "path_prefix": self.path_prefix}
+        if self._profile is not None:
+            return profiles.add("cprofile", details, stats=pstats.Stats(self._profile, stream=io.StringIO()))
+        self._sampler.stop()
+        return profiles.add("sampling", details, sampler=self._sampler)
+
+    def describe(self) -> dict:
+        return {"mode": self.mode, "path_prefix": self.path_prefix, "requested": self.count,
+                "remaining": self.remaining, "in_flight": self.in_flight, "completed": len(self.requests)}
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that profiles requests claimed by an armed RequestCapture. With nothing armed
+    it costs one attribute check per request; it is only installed when debug endpoints are enabled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        capture = debug_state.request_capture
+        if capture is None or scope["type"] != "http" or not capture.claim(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if capture.release(scope["method"], scope["path"], status, time.perf_counter() - started):
+                if debug_state.request_capture is capture:
+                    debug_state.request_capture = None
+                result = capture.finish()
+                print(f"🔬 Request profile {result.id} is ready")
+
+
+class MemoryTracker:
+    """tracemalloc snapshots and the biggest allocation changes between two of them"""
+
+    _ignored = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    )
+
+    def __init__(self, limit: int = 5):
+        self.limit = limit
+        self._snapshots = OrderedDict()
+        self._counter = 0
+
+    def start(self, frames: int):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self):
+        tracemalloc.stop()
+        self._snapshots.clear()
+
+    def take(self) -> dict:
+        if not tracemalloc.is_tracing():
+            raise ValueError("tracemalloc is not running, start it first")
+        self._counter += 1
+        snapshot_id = f"memory-{self._counter}"
+        snapshot = tracemalloc.take_snapshot().filter_traces(self._ignored)
+        self._snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(self._snapshots) > self.limit:
+            self._snapshots.popitem(last=False)
+        current, peak = tracemalloc.get_traced_memory()
+        return {"id": snapshot_id, "traced_bytes": current, "peak_bytes": peak}
+
+    def _get(self, snapshot_id: str):
+        if snapshot_id == "latest" and self._snapshots:
+            snapshot_id = next(reversed(self._snapshots))
+        if snapshot_id not in self._snapshots:
+            raise KeyError(f"Unknown memory snapshot: {snapshot_id}")
+        return snapshot_id, self._snapshots[snapshot_id][1]
+
+    def top(self, snapshot_id: str, limit: int, group_by: str) -> dict:
+        snapshot_id, snapshot = self._get(snapshot_id)
+        statistics = snapshot.statistics(group_by)
+        return {
+            "id": snapshot_id,
+            "total_bytes": sum(stat.size for stat in statistics),
+            "top": [{"location": str(stat.traceback), "bytes": stat.size, "blocks": stat.count} for stat in statistics[:limit]],
+        }
+
+    def diff(self, base_id: str, target_id: str, limit: int, group_by: str) -> dict:
+        base_id, base = self._get(base_id)
+        target_id, target = self._get(target_id)
+        changes = target.compare_to(base, group_by)
+        return {
+            "base": base_id,
+            "target": target_id,
+            "total_change_bytes": sum(stat.size_diff for stat in changes),
+            "top": [
+                {"location": str(stat.traceback), "change_bytes": stat.size_diff, "bytes": stat.size,
+                 "change_blocks": stat.count_diff}
+                for stat in changes[:limit]
+            ],
+        }
+
+    def describe(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {"tracing": tracing, "traced_bytes": current, "peak_bytes": peak, "snapshots": list(self._snapshots)}
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes a sleeping task; sustained lag means something blocks the loop"""
+
+    def __init__(self, window: int = 3000):
+        self.interval = 0.1
+        self.lags = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.started_at = None
+        self._task = None
+
+    def start(self, interval: float):
+        self.stop()
+        self.interval = interval
+        self.lags.clear()
+        self.max_lag = 0.0
+        self.started_at = time.time()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def report(self) -> dict:
+        lags = sorted(self.lags)
+
+        def percentile(fraction):
+            return round(lags[min(len(lags) - 1, int(len(lags) * fraction))] * 1000, 3) if lags else 0.0
+
+        return {
+            "running": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "samples": len(lags),
+            "window_seconds": round(len(lags) * self.interval, 1),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_in_window_ms": round(lags[-1] * 1000, 3) if lags else 0.0,
+            "max_since_start_ms": round(self.max_lag * 1000, 3),
+            "over_100ms": sum(1 for lag in lags if lag > 0.1),
+        }
+
+
+class DebugState:
+    """Per-worker profiling state shared by the middleware and the debug endpoints"""
+
+    def __init__(self):
+        self.request_capture = None
+        self.sampler = None
+        self.sampler_timer = None
+        self.memory = MemoryTracker()
+        self.loop_lag = LoopLagMonitor()
+
+    def start_sampling(self, interval: float, duration: float):
+        if self.sampler is not None:
+            raise ValueError("A sampling profile is already running")
+        self.sampler = SamplingProfiler(interval)
+        self.sampler.start()
+        if duration > 0:
+            self.sampler_timer = asyncio.get_running_loop().call_later(duration, self.stop_sampling)
+        return {"interval_ms": interval * 1000, "duration_seconds": duration}
+
+    def stop_sampling(self) -> ProfileResult:
+        if self.sampler is None:
+            raise ValueError("No sampling profile is running")
+        if self.sampler_timer is not None:
+            self.sampler_timer.cancel()
+            self.sampler_timer = None
+        sampler, self.sampler = self.sampler, None
+        sampler.stop()
+        result = profiles.add("sampling", {"trigger": "manual"}, sampler=sampler)
+        print(f"🔬 Sampling profile {result.id} is ready")
+        return result
+
+
+profiles = ProfileStore(config.DEBUG_MAX_PROFILES)
+debug_state = DebugState()
@@ -18,7 +18,8 @@ export const sendChatMessage = async (message: {
     const response = await Axios.post('/chat/', message);
     console.log('ApiService: Response received:', response);
     if(response && response.data){
-      return response.data;
+      // Responses come wrapped as { success, message, data }
+      return response.data.data ?? response.data;
     }
   }
   catch(error){
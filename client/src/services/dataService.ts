@@ -9,7 +9,7 @@ export const BrowseDeviceAPI = async(payload: {
         showSuccess('Data successfully added to database');
         return {
             success: true,
-            data: response?.data,
+            data: response?.data?.data ?? response?.data,
             message: 'Data successfully added to database'
         };
     }
@@ -33,7 +33,7 @@ export const GoogleDriveAPI = async(payload: {
         showSuccess('Google Drive data successfully added to database');
         return {
             success: true,
-            data: response?.data,
+            data: response?.data?.data ?? response?.data,
             message: 'Google Drive data successfully added to database'
         };
     }